@@ -0,0 +1,229 @@
+# api/asgi.py
+"""Variante ASGI da API de dados (mesmas rotas de api/main.py, mais agregados).
+
+Usa SQLAlchemy assíncrono com um pool asyncpg, de modo que consultas lentas não
+prendem threads do servidor. O número de consultas simultâneas é limitado por um
+semáforo e cada consulta tem tempo máximo de execução.
+
+Execução: gunicorn api.asgi:app -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT_API
+"""
+import os
+import sys
+import asyncio
+from datetime import date
+
+from quart import Quart, jsonify, request
+from quart_cors import cors
+from sqlalchemy import select, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+# Adicionar o diretório raiz do projeto ao sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from api.main import PajData, DataVersion, search_conditions, DB_USERNAME, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME # Mesmo modelo e configuração da API síncrona
+
+app = Quart(__name__)
+app = cors(app, allow_origin="*") # Habilitar CORS para todas as rotas
+
+# Limites de concorrência e de tempo das consultas
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+API_MAX_CONCURRENT_QUERIES = int(os.getenv("API_MAX_CONCURRENT_QUERIES", str(DB_POOL_SIZE)))
+API_QUERY_TIMEOUT = float(os.getenv("API_QUERY_TIMEOUT", "15")) # segundos
+
+def async_database_url():
+    """URL do banco com o driver asyncpg: DATABASE_URL (como em api/main.py), se definida, ou as variáveis DB_*."""
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        return f"postgresql+asyncpg://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    url = make_url(url)
+    if url.get_backend_name() != 'postgresql':
+        raise RuntimeError(f"api/asgi.py requer PostgreSQL (DATABASE_URL usa {url.get_backend_name()})")
+    query = dict(url.query)
+    if 'sslmode' in query: # Parâmetro do libpq; o asyncpg recebe o mesmo valor em `ssl`
+        query['ssl'] = query.pop('sslmode')
+    # postgresql:// ou postgresql+psycopg2:// -> mesmo banco, driver assíncrono
+    return url.set(drivername='postgresql+asyncpg', query=query).render_as_string(hide_password=False)
+
+
+engine = create_async_engine(
+    async_database_url(),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    # O PostgreSQL também cancela a consulta se o cliente desistir por timeout
+    connect_args={"server_settings": {"statement_timeout": str(int(API_QUERY_TIMEOUT * 1000))}},
+)
+
+paj_table = PajData.__table__
+version_table = DataVersion.__table__
+DATE_COLUMN = paj_table.c['Data de Abertura do PAJ']
+
+# Parâmetro da query string -> coluna da tabela (mesmas chaves usadas no dashboard)
+FILTER_COLUMNS = {
+    'oficio': paj_table.c['Oficio'],
+    'pretensao': paj_table.c['Tipo de Pretensão'],
+    'materia': paj_table.c['Materia'],
+    'usuario': paj_table.c['Usuário'],
+}
+
+_query_slots = asyncio.Semaphore(API_MAX_CONCURRENT_QUERIES)
+
+
+class QueryRejected(Exception):
+    """Limite de consultas simultâneas atingido (fila esperou além do timeout)."""
+
+
+async def run_query(statement):
+    """Executa a consulta respeitando o limite de concorrência e o timeout."""
+    try:
+        await asyncio.wait_for(_query_slots.acquire(), timeout=API_QUERY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise QueryRejected()
+    try:
+        async with engine.connect() as conn:
+            result = await asyncio.wait_for(conn.execute(statement), timeout=API_QUERY_TIMEOUT)
+            return result.mappings().all()
+    finally:
+        _query_slots.release()
+
+
+def row_to_dict(row):
+    # Mesmo formato de PajData.to_dict()
+    return {
+        key: value.isoformat() if isinstance(value, date) else value
+        for key, value in row.items() if key != 'id'
+    }
+
+
+async def data_version():
+    """Versão atual dos dados (mesma linha de paj_data_version lida por get_data_version em api/main.py)."""
+    rows = await run_query(select(version_table.c.version).where(version_table.c.id == 1))
+    return rows[0]['version'] if rows else 0
+
+
+def filter_conditions(args):
+    """Condições WHERE a partir de start/end (YYYY-MM-DD), das listas de filtros categóricos e da busca textual `q`."""
+    conditions = []
+    start, end = args.get('start'), args.get('end')
+    if start:
+        conditions.append(DATE_COLUMN >= date.fromisoformat(start[:10]))
+    if end:
+        conditions.append(DATE_COLUMN <= date.fromisoformat(end[:10]))
+    for param, column in FILTER_COLUMNS.items():
+        values = args.getlist(param)
+        if values:
+            conditions.append(column.in_(values))
+    conditions.extend(search_conditions(args.get('q'), 'postgresql'))
+    return conditions
+
+
+@app.errorhandler(QueryRejected)
+async def handle_query_rejected(e):
+    return jsonify({"error": "Servidor ocupado, tente novamente"}), 503
+
+
+@app.errorhandler(asyncio.TimeoutError)
+async def handle_query_timeout(e):
+    app.logger.error("Tempo limite excedido em consulta da API")
+    return jsonify({"error": "Tempo limite da consulta excedido"}), 504
+
+
+@app.route('/api/data', methods=['GET'])
+async def get_all_data():
+    try:
+        # A versão é lida antes dos dados: se mudar no meio, o dashboard recebe a notificação e recarrega
+        version = await data_version()
+        rows = await run_query(select(paj_table).where(*search_conditions(request.args.get('q'), 'postgresql')))
+        response = jsonify([row_to_dict(r) for r in rows])
+        response.headers['X-Data-Version'] = str(version)
+        return response
+    except (QueryRejected, asyncio.TimeoutError):
+        raise
+    except Exception as e:
+        # Log do erro no servidor
+        app.logger.error(f"Erro ao buscar dados da API: {e}")
+        # Retornar uma resposta de erro mais genérica para o cliente
+        return jsonify({"error": "Erro ao processar a solicitação de dados"}), 500
+
+
+@app.route('/api/version', methods=['GET'])
+async def get_version():
+    try:
+        return jsonify({"version": await data_version()})
+    except (QueryRejected, asyncio.TimeoutError):
+        raise
+    except Exception as e:
+        app.logger.error(f"Erro ao consultar a versão dos dados: {e}")
+        return jsonify({"error": "Erro ao processar a solicitação de dados"}), 500
+
+
+@app.route('/api/aggregates', methods=['GET'])
+async def get_aggregates():
+    """Contagens por dia e por coluna categórica para o intervalo de datas e filtros informados."""
+    try:
+        conditions = filter_conditions(request.args)
+    except ValueError:
+        return jsonify({"error": "Data inválida, use o formato YYYY-MM-DD"}), 400
+    # Como no dashboard (compute_counts), PAJs sem data de abertura ficam fora de todas as contagens,
+    # para que `total` seja igual à soma de `days`
+    conditions.append(DATE_COLUMN.isnot(None))
+
+    try:
+        # As consultas de agrupamento rodam em paralelo, cada uma em sua conexão do pool
+        day_rows, *column_rows = await asyncio.gather(
+            run_query(select(DATE_COLUMN.label('value'), func.count().label('count')).where(*conditions).group_by(DATE_COLUMN).order_by(DATE_COLUMN)),
+            *[
+                run_query(select(column.label('value'), func.count().label('count')).where(*conditions).group_by(column).order_by(func.count().desc()))
+                for column in FILTER_COLUMNS.values()
+            ]
+        )
+    except (QueryRejected, asyncio.TimeoutError):
+        raise
+    except Exception as e:
+        app.logger.error(f"Erro ao calcular agregados da API: {e}")
+        return jsonify({"error": "Erro ao processar a solicitação de dados"}), 500
+
+    return jsonify({
+        'total': sum(r['count'] for r in day_rows),
+        'days': [{'date': r['value'].isoformat(), 'count': r['count']} for r in day_rows],
+        'columns': {
+            column.name: [{'value': r['value'], 'count': r['count']} for r in rows if r['value'] is not None]
+            for column, rows in zip(FILTER_COLUMNS.values(), column_rows)
+        },
+    })
+
+
+
+@app.route('/api/search', methods=['GET'])
+async def search_paj():
+    """Números de PAJ cujo Assistido ou Pretensão corresponde à busca `q`."""
+    conditions = search_conditions(request.args.get('q'), 'postgresql')
+    if not conditions:
+        return jsonify({"error": "Informe o parâmetro q"}), 400
+    try:
+        version = await data_version()
+        rows = await run_query(select(paj_table.c['PAJ'].label('paj')).where(*conditions).distinct())
+        return jsonify({"version": version, "paj": [r['paj'] for r in rows]})
+    except (QueryRejected, asyncio.TimeoutError):
+        raise
+    except Exception as e:
+        app.logger.error(f"Erro na busca textual: {e}")
+        return jsonify({"error": "Erro ao processar a solicitação de dados"}), 500
+
+# Rota de health check
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    return jsonify({"status": "API is running"}), 200
+
+
+@app.after_serving
+async def dispose_engine():
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    app.run(debug=True, host='0.0.0.0', port=5002) # Porta diferente da API síncrona e do Dash app
@@ -1,6 +1,8 @@
 # api/create_tables.py
 import os
+import re
 import sys
+from datetime import date, timedelta
 from sqlalchemy import create_engine, text
 
 # Adicionar o diretório raiz do projeto ao sys.path
@@ -8,27 +10,163 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from api.main import db, app # Importar db e app de api.main
+from api.main import db, app, PajData, DataVersion # Importar db, app e os modelos de api.main
+
+# Particionamento de paj_data por data de abertura (somente PostgreSQL): 'none', 'year' ou 'month'.
+# Só vale na criação da tabela: a granularidade fica registrada no catálogo (comentário da tabela)
+# e é de lá que populate_db.py a lê.
+PAJ_PARTITION_BY = os.getenv("PAJ_PARTITION_BY", "none").lower()
+PARTITION_GRANULARITIES = ('year', 'month')
+PARTITION_COLUMN = 'Data de Abertura do PAJ'
+PARTITION_COMMENT_PREFIX = 'partition_by='
+
+def _quote(name):
+    return db.engine.dialect.identifier_preparer.quote(name)
+
+def partition_bounds(day, granularity):
+    """Nome da partição que contém `day` e seu intervalo [início, fim)."""
+    if granularity == 'year':
+        start, end = date(day.year, 1, 1), date(day.year + 1, 1, 1)
+        suffix = f"{day.year}"
+    else:
+        start = date(day.year, day.month, 1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        suffix = f"{day.year}_{day.month:02d}"
+    return f"{PajData.__tablename__}_{suffix}", start, end
+
+def create_partitioned_paj_table():
+    """Cria paj_data particionada por intervalo (RANGE) da data de abertura.
+
+    Uma restrição de unicidade numa tabela particionada precisa incluir a coluna de
+    particionamento, que aceita nulos; por isso `id` (ainda gerado por sequência) tem
+    apenas um índice. PAJs sem data vão para a partição padrão.
+    """
+    table = PajData.__table__
+    dialect = db.engine.dialect
+    columns = ['id SERIAL NOT NULL'] + [
+        f"{_quote(c.name)} {c.type.compile(dialect=dialect)}" for c in table.columns if c.name != 'id'
+    ]
+    with db.engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE {table.name} ({', '.join(columns)}) PARTITION BY RANGE ({_quote(PARTITION_COLUMN)})"))
+        conn.execute(text(f"CREATE INDEX ix_{table.name}_id ON {table.name} (id)"))
+        conn.execute(text(f"CREATE INDEX ix_{table.name}_data_abertura ON {table.name} ({_quote(PARTITION_COLUMN)})"))
+        conn.execute(text(f"CREATE TABLE {table.name}_default PARTITION OF {table.name} DEFAULT"))
+        conn.execute(text(f"COMMENT ON TABLE {table.name} IS '{PARTITION_COMMENT_PREFIX}{PAJ_PARTITION_BY}'"))
+
+def is_partitioned():
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    with db.engine.connect() as conn:
+        return conn.execute(
+            text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"),
+            {"table": PajData.__tablename__}
+        ).first() is not None
+
+def partition_granularity():
+    """Granularidade ('year' ou 'month') de paj_data lida do catálogo, ou None se a tabela não for particionada.
+
+    Vem do comentário gravado por create_partitioned_paj_table; em tabelas criadas antes
+    dele, é deduzida dos nomes das partições existentes. Se não for possível determiná-la,
+    usa PAJ_PARTITION_BY e, sem ela, falha: sem partições, toda carga iria para a partição padrão.
+    """
+    if not is_partitioned():
+        return None
+    table = PajData.__tablename__
+    with db.engine.connect() as conn:
+        comment = conn.execute(text("SELECT obj_description(to_regclass(:table), 'pg_class')"), {"table": table}).scalar()
+        partitions = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:table)"
+        ), {"table": table}).scalars().all()
+    if comment and comment.startswith(PARTITION_COMMENT_PREFIX) and comment[len(PARTITION_COMMENT_PREFIX):] in PARTITION_GRANULARITIES:
+        return comment[len(PARTITION_COMMENT_PREFIX):]
+    if any(re.fullmatch(rf"{table}_\d{{4}}_\d{{2}}", name) for name in partitions):
+        return 'month'
+    if any(re.fullmatch(rf"{table}_\d{{4}}", name) for name in partitions):
+        return 'year'
+    if PAJ_PARTITION_BY in PARTITION_GRANULARITIES:
+        return PAJ_PARTITION_BY
+    raise RuntimeError(
+        f"{table} é particionada, mas a granularidade das partições não está registrada no banco. "
+        f"Defina PAJ_PARTITION_BY (year ou month) com o valor usado na criação da tabela."
+    )
+
+def ensure_partitions(dates):
+    """Cria as partições que faltam para as datas informadas. Retorna os nomes das partições criadas."""
+    granularity = partition_granularity()
+    if granularity is None:
+        if PAJ_PARTITION_BY in PARTITION_GRANULARITIES and db.engine.dialect.name == 'postgresql':
+            print(f"Aviso: PAJ_PARTITION_BY={PAJ_PARTITION_BY}, mas {PajData.__tablename__} não é particionada; nenhuma partição criada.")
+        return []
+    if PAJ_PARTITION_BY in PARTITION_GRANULARITIES and PAJ_PARTITION_BY != granularity:
+        print(f"Aviso: PAJ_PARTITION_BY={PAJ_PARTITION_BY} ignorado; {PajData.__tablename__} é particionada por {granularity}.")
+    table = PajData.__tablename__
+    created = []
+    for name, start, end in sorted({partition_bounds(d, granularity) for d in dates}):
+        with db.engine.begin() as conn:
+            if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+                continue
+            conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+            # Linhas do período que já estavam na partição padrão passam para a nova (senão o ATTACH falha)
+            conn.execute(text(
+                f"WITH moved AS (DELETE FROM {table}_default WHERE {_quote(PARTITION_COLUMN)} >= :start AND {_quote(PARTITION_COLUMN)} < :end RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ), {"start": start, "end": end})
+            conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"))
+        created.append(name)
+    return created
+
+def create_search_indexes():
+    """Índices GIN de trigramas (pg_trgm) para a busca textual em Assistido e Pretensão.
+
+    Indexam paj_search_text(coluna), a mesma expressão usada por search_conditions em
+    api/main.py: minúsculas e sem acentos (unaccent). O wrapper é IMMUTABLE, exigência
+    para índices de expressão. Os trigramas atendem LIKE '%termo%' em qualquer posição,
+    o que um tsvector (busca por palavras/radicais) não faz. Em tabela particionada o
+    índice é criado em todas as partições, inclusive nas que forem anexadas depois.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    table = PajData.__tablename__
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION paj_search_text(value text) RETURNS text "
+            "LANGUAGE sql IMMUTABLE PARALLEL SAFE "
+            "AS $$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, value)) $$"
+        ))
+        for column, suffix in ((PajData.assistido, 'assistido'), (PajData.pretensao, 'pretensao')):
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_{suffix}_trgm ON {table} "
+                f"USING gin (paj_search_text({_quote(column.name)}) gin_trgm_ops)"
+            ))
+    return True
 
 def create_db_tables():
     """Cria as tabelas no banco de dados se não existirem."""
     with app.app_context(): # Precisamos do contexto da aplicação Flask para SQLAlchemy
         print("Conectando ao banco de dados...")
         try:
-            # Verificar se a tabela já existe
+            # Verificar se as tabelas já existem
             inspector = db.inspect(db.engine)
-            if not inspector.has_table(PajData.__tablename__):
-                print(f"Criando tabela {PajData.__tablename__}...")
-                db.create_all() # Cria todas as tabelas definidas nos modelos SQLAlchemy
-                print(f"Tabela {PajData.__tablename__} criada com sucesso.")
+            missing = [m.__tablename__ for m in (PajData, DataVersion) if not inspector.has_table(m.__tablename__)]
+            if missing:
+                print(f"Criando tabelas {', '.join(missing)}...")
+                if PajData.__tablename__ in missing and PAJ_PARTITION_BY in PARTITION_GRANULARITIES:
+                    if db.engine.dialect.name == 'postgresql':
+                        create_partitioned_paj_table()
+                        print(f"Tabela {PajData.__tablename__} particionada por {'ano' if PAJ_PARTITION_BY == 'year' else 'mês'} (as partições são criadas por populate_db.py).")
+                    else:
+                        print(f"Particionamento disponível apenas no PostgreSQL; {PajData.__tablename__} será criada sem partições.")
+                db.create_all() # Cria as tabelas que faltam (as existentes não são alteradas)
+                print(f"Tabelas {', '.join(missing)} criadas com sucesso.")
             else:
-                print(f"Tabela {PajData.__tablename__} já existe.")
+                print(f"Tabelas {PajData.__tablename__} e {DataVersion.__tablename__} já existem.")
+            if create_search_indexes():
+                print("Índices de busca textual (pg_trgm) verificados.")
         except Exception as e:
             print(f"Erro ao conectar ou criar tabelas: {e}")
             print("Verifique as configurações do banco de dados (DB_USERNAME, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME) e se o PostgreSQL está rodando.")
 
 if __name__ == '__main__':
-    # Importar o modelo aqui para garantir que seja registrado antes de create_all
-    from api.main import PajData
     create_db_tables()
-
@@ -1,9 +1,11 @@
 # api/main.py
 import os
 import sys
-from flask import Flask, jsonify
+import unicodedata
+from flask import Flask, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import text, func, or_
 import pandas as pd
 
 # Adicionar o diretório raiz do projeto ao sys.path para importações corretas
@@ -24,11 +26,15 @@ DB_HOST = os.getenv("DB_HOST", "localhost")       # Default para desenvolvimento
 DB_PORT = os.getenv("DB_PORT", "5432")          # Default para desenvolvimento local
 DB_NAME = os.getenv("DB_NAME", "sisdpu_db")      # Default para desenvolvimento local
 
-app.config['SQLALCHEMY_DATABASE_URI'] = f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL, se definida, tem precedência (ex.: sqlite:///paj.db como substituto local em testes de carga)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL", f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
 
+# Canal LISTEN/NOTIFY em que cada alteração de paj_data anuncia a nova versão dos dados
+DATA_CHANGED_CHANNEL = os.getenv("DATA_CHANGED_CHANNEL", "paj_data_changed")
+
 # Modelo da Tabela de Dados (equivalente a tratado_filtrado.xlsx)
 class PajData(db.Model):
     __tablename__ = 'paj_data'
@@ -62,17 +68,94 @@ class PajData(db.Model):
             'Usuário': self.usuario
         }
 
+# Versão dos dados de paj_data (linha única), incrementada a cada carga ou alteração
+class DataVersion(db.Model):
+    __tablename__ = 'paj_data_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+def get_data_version():
+    row = db.session.get(DataVersion, 1)
+    return row.version if row else 0
+
+def bump_data_version():
+    """Incrementa a versão dos dados e notifica os dashboards (NOTIFY com a nova versão).
+
+    O NOTIFY só é entregue no commit, junto com a nova versão; o bloqueio da linha
+    garante que as versões anunciadas sejam estritamente crescentes.
+    """
+    row = db.session.get(DataVersion, 1, with_for_update=True)
+    if row is None:
+        row = DataVersion(id=1, version=0)
+        db.session.add(row)
+    row.version += 1
+    version = row.version
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": DATA_CHANGED_CHANNEL, "payload": str(version)})
+    db.session.commit()
+    return version
+
+# Busca textual: cada termo precisa aparecer (substring, sem diferenciar maiúsculas e acentos)
+# em Assistido ou Pretensão. No PostgreSQL usa paj_search_text(), a mesma expressão dos
+# índices GIN de trigramas criados por create_tables.py.
+SEARCH_COLUMNS = [PajData.assistido, PajData.pretensao]
+
+def normalize_search_text(text):
+    """Minúsculas e sem acentos (mesma normalização de src/search.py)."""
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+def _search_text(column, dialect_name):
+    if dialect_name == 'postgresql':
+        return func.paj_search_text(column)
+    return func.lower(column) # Outros bancos (ex.: SQLite em testes locais): sem remover acentos
+
+def search_conditions(query, dialect_name):
+    """Condições WHERE da busca textual `query` (lista vazia se não houver termos)."""
+    conditions = []
+    for term in normalize_search_text(query or '').split():
+        pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append(or_(*[_search_text(c, dialect_name).like(pattern, escape='\\') for c in SEARCH_COLUMNS]))
+    return conditions
+
 @app.route('/api/data', methods=['GET'])
 def get_all_data():
     try:
-        data = PajData.query.all()
-        return jsonify([d.to_dict() for d in data])
+        # A versão é lida antes dos dados: se mudar no meio, o dashboard recebe a notificação e recarrega
+        version = get_data_version()
+        data = PajData.query.filter(*search_conditions(request.args.get('q'), db.engine.dialect.name)).all()
+        response = jsonify([d.to_dict() for d in data])
+        response.headers['X-Data-Version'] = str(version)
+        return response
     except Exception as e:
         # Log do erro no servidor
         app.logger.error(f"Erro ao buscar dados da API: {e}")
         # Retornar uma resposta de erro mais genérica para o cliente
         return jsonify({"error": "Erro ao processar a solicitação de dados"}), 500
 
+@app.route('/api/version', methods=['GET'])
+def get_version():
+    try:
+        return jsonify({"version": get_data_version()})
+    except Exception as e:
+        app.logger.error(f"Erro ao consultar a versão dos dados: {e}")
+        return jsonify({"error": "Erro ao processar a solicitação de dados"}), 500
+
+@app.route('/api/search', methods=['GET'])
+def search_paj():
+    """Números de PAJ cujo Assistido ou Pretensão corresponde à busca `q`."""
+    conditions = search_conditions(request.args.get('q'), db.engine.dialect.name)
+    if not conditions:
+        return jsonify({"error": "Informe o parâmetro q"}), 400
+    try:
+        version = get_data_version()
+        rows = db.session.query(PajData.paj_numero).filter(*conditions).distinct().all()
+        return jsonify({"version": version, "paj": [r[0] for r in rows]})
+    except Exception as e:
+        app.logger.error(f"Erro na busca textual: {e}")
+        return jsonify({"error": "Erro ao processar a solicitação de dados"}), 500
+
 # Rota de health check
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -10,7 +10,8 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from api.main import db, app, PajData # Importar db, app e o modelo PajData
+from api.main import db, app, PajData, bump_data_version # Importar db, app e o modelo PajData
+from api.create_tables import ensure_partitions
 
 # Caminho para a planilha de dados tratados
 DATA_FILE_PATH = os.path.join(project_root, "data", "tratado_filtrado.xlsx")
@@ -34,6 +35,16 @@ def populate_database():
         # Isso é crucial se os nomes das colunas no Excel não forem exatamente iguais aos nomes no modelo
         # ou se você usou o argumento `name` no db.Column.
         # O modelo PajData já usa o argumento `name` para mapear para os nomes das colunas do Excel.
+        # Com paj_data particionada (granularidade lida do catálogo), cria antes da carga as partições dos períodos da planilha
+        # Com paj_data particionada (PAJ_PARTITION_BY), cria antes da carga as partições dos períodos da planilha
+        try:
+            opening_dates = pd.to_datetime(df["Data de Abertura do PAJ"], errors='coerce', dayfirst=True).dropna().dt.date.unique()
+            created = ensure_partitions(opening_dates)
+            if created:
+                print(f"Partições criadas: {', '.join(created)}")
+        except Exception as e:
+            print(f"Erro ao criar partições de {PajData.__tablename__}: {e}")
+            return
 
         # Limpar a tabela antes de popular para evitar duplicatas se o script for rodado múltiplas vezes
         # Comente esta linha se você quiser adicionar dados sem limpar os existentes
@@ -112,6 +123,14 @@ def populate_database():
             db.session.rollback()
             print(f"Erro ao commitar registros finais: {e}")
 
+        # Anuncia a nova versão dos dados (LISTEN/NOTIFY) para que os dashboards descartem seus caches
+        try:
+            version = bump_data_version()
+            print(f"Versão dos dados atualizada para {version}.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao atualizar a versão dos dados: {e}")
+
         print(f"População do banco de dados concluída.")
         print(f"Total de registros inseridos: {count_inserted}")
         print(f"Total de registros pulados devido a erros: {count_skipped}")
@@ -0,0 +1,303 @@
+// assets/clientside_filter.js
+// Filtragem e contagem no navegador sobre o payload colunar gerado por
+// src/columnar.py. Usado quando CLIENTSIDE_FILTERING está habilitado.
+// Também monta a URL do link de exportação (em qualquer modo).
+
+(function () {
+    // Mesmas cores de DPU_COLORS em src/figures.py
+    var COLORS = {
+        primary_green: '#4d9529',
+        primary_teal: '#00898f',
+        dark_gray: '#373737'
+    };
+    var MS_PER_DAY = 86400000;
+    // Limites padrão de barras por gráfico (o payload traz os valores configurados no servidor em bar_limits)
+    var BAR_LIMITS = {'Oficio': 20, 'Tipo de Pretensão': 20, 'Materia': 20, 'Usuário': 15};
+    // Ação de cada barra em customdata[1], como em src/figures.py
+    var PAGE_PREVIOUS = -1, CATEGORY = 0, PAGE_NEXT = 1;
+
+    var TYPED_ARRAYS = {
+        '|u1': Uint8Array,
+        '<u2': Uint16Array,
+        '<u4': Uint32Array,
+        '<i4': Int32Array
+    };
+
+    // Cache do último payload decodificado (o Store só muda quando os dados são recarregados)
+    var cachedPayload = null;
+    var cachedDecoded = null;
+
+    function decodeArray(encoded, dtype) {
+        var binary = atob(encoded);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return new TYPED_ARRAYS[dtype](bytes.buffer);
+    }
+
+    function decodePayload(payload) {
+        if (payload === cachedPayload) {
+            return cachedDecoded;
+        }
+        var columns = {};
+        Object.keys(payload.columns).forEach(function (key) {
+            var spec = payload.columns[key];
+            columns[key] = {
+                categories: spec.categories,
+                codes: decodeArray(spec.codes, spec.dtype)
+            };
+        });
+        cachedPayload = payload;
+        cachedDecoded = {
+            length: payload.length,
+            days: decodeArray(payload.days, '<i4'),
+            columns: columns
+        };
+        return cachedDecoded;
+    }
+
+    // Máscara da busca textual (bits empacotados, do menos significativo para o mais), decodificada uma vez por resposta
+    var cachedSearch = null;
+    var cachedSearchBits = null;
+
+    function decodeSearchMask(searchMask, payload) {
+        // Máscaras de outro conjunto (resposta ainda não chegou após a troca de dados) são ignoradas
+        if (!searchMask || searchMask.dataset !== payload.dataset || searchMask.length !== payload.length) {
+            return null;
+        }
+        if (searchMask !== cachedSearch) {
+            cachedSearch = searchMask;
+            cachedSearchBits = decodeArray(searchMask.bits, '|u1');
+        }
+        return cachedSearchBits;
+    }
+
+    function toDay(dateStr) {
+        // 'YYYY-MM-DD' ou 'YYYY-MM-DDTHH:MM:SS' -> dias desde 1970-01-01
+        var p = dateStr.slice(0, 10).split('-');
+        return Math.floor(Date.UTC(+p[0], +p[1] - 1, +p[2]) / MS_PER_DAY);
+    }
+
+    function dayToIso(day) {
+        return new Date(day * MS_PER_DAY).toISOString().slice(0, 10);
+    }
+
+    function selectionMask(column, selected) {
+        if (!selected || selected.length === 0) {
+            return null;
+        }
+        var wanted = {};
+        selected.forEach(function (v) { wanted[v] = true; });
+        var mask = new Uint8Array(column.categories.length);
+        for (var i = 0; i < column.categories.length; i++) {
+            mask[i] = wanted[column.categories[i]] ? 1 : 0;
+        }
+        return mask;
+    }
+
+    function emptyFigure(title) {
+        return {data: [], layout: {title: title}};
+    }
+
+    // Mesmo critério de top_positions em src/figures.py: contagem decrescente, empates na ordem das categorias
+    function ranksBefore(counts, a, b) {
+        return counts[a] > counts[b] || (counts[a] === counts[b] && a < b);
+    }
+
+    function topPositions(counts, positions, stop) {
+        // Seleção parcial (quickselect): só as `stop` primeiras posições do ranking são ordenadas
+        var k = stop - 1;
+        var lo = 0, hi = positions.length - 1;
+        while (stop < positions.length && lo < hi) {
+            var pivot = positions[(lo + hi) >> 1];
+            var i = lo, j = hi;
+            while (i <= j) {
+                while (ranksBefore(counts, positions[i], pivot)) { i++; }
+                while (ranksBefore(counts, pivot, positions[j])) { j--; }
+                if (i <= j) {
+                    var tmp = positions[i];
+                    positions[i] = positions[j];
+                    positions[j] = tmp;
+                    i++;
+                    j--;
+                }
+            }
+            if (k <= j) {
+                hi = j;
+            } else if (k >= i) {
+                lo = i;
+            } else {
+                break;
+            }
+        }
+        return positions.slice(0, stop).sort(function (a, b) { return ranksBefore(counts, a, b) ? -1 : 1; });
+    }
+
+    function barFigure(column, counts, limit, offset, title, xTitle, color, tickangle) {
+        var positions = [];
+        var total = 0;
+        for (var i = 0; i < column.categories.length; i++) {
+            if (counts[i] > 0) {
+                positions.push(i);
+                total += counts[i];
+            }
+        }
+        limit = limit || Math.max(positions.length, 1);
+        // Deslocamento além do fim (os filtros reduziram as categorias): mostra a última página
+        offset = Math.min(offset || 0, Math.max(Math.floor((positions.length - 1) / limit) * limit, 0));
+        var ranked = topPositions(counts, positions, Math.min(offset + limit, positions.length));
+
+        var x = [], y = [], customdata = [], colors = [];
+        function addBar(label, value, action) {
+            x.push(label);
+            y.push(value);
+            customdata.push([value / total * 100, action]);
+            colors.push(action === CATEGORY ? color : COLORS.dark_gray);
+        }
+        var previous = 0, shown = 0;
+        for (var r = 0; r < offset; r++) {
+            previous += counts[ranked[r]];
+        }
+        if (offset) {
+            addBar('« Anteriores (' + offset + ' categorias)', previous, PAGE_PREVIOUS);
+        }
+        for (r = offset; r < ranked.length; r++) {
+            addBar(column.categories[ranked[r]], counts[ranked[r]], CATEGORY);
+            shown += counts[ranked[r]];
+        }
+        var remaining = total - previous - shown;
+        if (remaining) {
+            addBar('Outros (' + (positions.length - ranked.length) + ' categorias)', remaining, PAGE_NEXT);
+        }
+
+        var layout = {
+            title: {text: offset ? title + ' (posições ' + (offset + 1) + ' a ' + ranked.length + ')' : title},
+            xaxis: {title: {text: xTitle}},
+            yaxis: {title: {text: 'Quantidade'}}
+        };
+        if (tickangle !== undefined) {
+            layout.xaxis.tickangle = tickangle;
+        }
+        return {
+            data: [{
+                type: 'bar', x: x, y: y, customdata: customdata,
+                texttemplate: '%{y} (%{customdata[0]:.1f}%)', textposition: 'auto', marker: {color: colors}
+            }],
+            layout: layout
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        sisdpu: {
+            update_graphs: function (payload, startDate, endDate, oficioSelected, pretensaoSelected, materiaSelected, usuarioSelected, searchMask, barOffsets) {
+                if (!payload || !payload.length) {
+                    var empty = emptyFigure('Sem dados para exibir');
+                    return [empty, empty, empty, empty, empty];
+                }
+                var data = decodePayload(payload);
+                var cols = data.columns;
+                var keys = ['oficio', 'pretensao', 'materia', 'usuario'];
+                var selections = [oficioSelected, pretensaoSelected, materiaSelected, usuarioSelected];
+
+                var masks = [], codes = [], counts = [];
+                keys.forEach(function (key, k) {
+                    var mask = selectionMask(cols[key], selections[k]);
+                    if (mask) {
+                        masks.push(mask);
+                        codes.push(cols[key].codes);
+                    }
+                    // Posição extra: código dos valores ausentes (ver src/columnar.py), nunca exibido
+                    counts.push(new Int32Array(cols[key].categories.length + 1));
+                });
+                var allCodes = keys.map(function (key) { return cols[key].codes; });
+                var searchBits = decodeSearchMask(searchMask, payload);
+
+                var useDates = startDate && endDate;
+                var startDay = useDates ? toDay(startDate) : 0;
+                var endDay = useDates ? toDay(endDate) : 0;
+                var days = data.days;
+                var byDay = {};
+                var total = 0;
+
+                for (var r = 0; r < data.length; r++) {
+                    var day = days[r];
+                    if (useDates && (day < startDay || day > endDay)) {
+                        continue;
+                    }
+                    if (searchBits && !((searchBits[r >> 3] >> (r & 7)) & 1)) {
+                        continue;
+                    }
+                    var keep = true;
+                    for (var m = 0; m < masks.length; m++) {
+                        if (!masks[m][codes[m][r]]) {
+                            keep = false;
+                            break;
+                        }
+                    }
+                    if (!keep) {
+                        continue;
+                    }
+                    total++;
+                    byDay[day] = (byDay[day] || 0) + 1;
+                    for (var c = 0; c < 4; c++) {
+                        counts[c][allCodes[c][r]]++;
+                    }
+                }
+
+                if (total === 0) {
+                    var none = emptyFigure('Nenhum dado corresponde aos filtros selecionados');
+                    return [none, none, none, none, none];
+                }
+
+                var sortedDays = Object.keys(byDay).map(Number).sort(function (a, b) { return a - b; });
+                var limits = payload.bar_limits || BAR_LIMITS;
+                var offsets = barOffsets || {};
+                var timeSeriesFig = {
+                    data: [{
+                        type: 'scatter',
+                        mode: 'lines',
+                        x: sortedDays.map(dayToIso),
+                        y: sortedDays.map(function (d) { return byDay[d]; }),
+                        line: {color: COLORS.primary_teal}
+                    }],
+                    layout: {
+                        title: {text: 'Volume de PAJs por Data de Abertura'},
+                        xaxis: {title: {text: 'Data de Abertura'}},
+                        yaxis: {title: {text: 'Número de PAJs'}}
+                    }
+                };
+
+                return [
+                    timeSeriesFig,
+                    barFigure(cols.oficio, counts[0], limits['Oficio'], offsets['Oficio'], 'Distribuição por Ofício', 'Ofício', COLORS.primary_green),
+                    barFigure(cols.pretensao, counts[1], limits['Tipo de Pretensão'], offsets['Tipo de Pretensão'], 'Distribuição por Tipo de Pretensão', 'Tipo de Pretensão', COLORS.primary_teal, -45),
+                    barFigure(cols.materia, counts[2], limits['Materia'], offsets['Materia'], 'Distribuição por Matéria', 'Matéria', COLORS.primary_green, -45),
+                    barFigure(cols.usuario, counts[3], limits['Usuário'], offsets['Usuário'], 'Distribuição por Usuário', 'Usuário', COLORS.primary_teal, -45)
+                ];
+            },
+
+            // URL da rota /export com o conjunto de dados e o estado atual dos filtros
+            export_href: function (storeData, exportFormat, startDate, endDate, oficioSelected, pretensaoSelected, materiaSelected, usuarioSelected, searchQuery, baseUrl) {
+                if (!storeData || !storeData.dataset) {
+                    return '';
+                }
+                var params = new URLSearchParams();
+                params.append('dataset', storeData.dataset);
+                params.append('format', exportFormat || 'csv');
+                if (startDate && endDate) {
+                    params.append('start', startDate);
+                    params.append('end', endDate);
+                }
+                var filters = {oficio: oficioSelected, pretensao: pretensaoSelected, materia: materiaSelected, usuario: usuarioSelected};
+                Object.keys(filters).forEach(function (key) {
+                    (filters[key] || []).forEach(function (value) { params.append(key, value); });
+                });
+                if (searchQuery && searchQuery.trim()) {
+                    params.append('q', searchQuery.trim());
+                }
+                return baseUrl + '?' + params.toString();
+            }
+        }
+    });
+})();
@@ -0,0 +1,317 @@
+# scripts/load_test.py
+"""Teste de carga local do dashboard Dash e da API Flask.
+
+Sintetiza sequências realistas de requisições `_dash-update-component` (escolha da
+fonte de dados, mudança do intervalo de datas, filtros de múltipla seleção) a partir
+das dependências publicadas pelo próprio app (`_dash-dependencies`) e as reproduz
+com vários usuários virtuais simultâneos, junto com chamadas à API de dados.
+Ao final, relata vazão e latências p50/p95/p99 por callback/rota. Com
+CLIENTSIDE_FILTERING ativo os gráficos são atualizados no navegador: o teste
+reproduz apenas os callbacks do servidor usados por eles (payload colunar, máscara
+da busca e paginação das barras).
+
+Exemplos:
+    # Sobe gunicorn (dashboard + API com SQLite) localmente e roda 16 usuários por 60s
+    python scripts/load_test.py --start-servers --users 16 --duration 60
+
+    # Contra servidores já em execução, salvando a sequência sintetizada
+    python scripts/load_test.py --dash-url http://127.0.0.1:8050 --api-url http://127.0.0.1:5001 --save-sequence seq.json
+
+    # Reproduz uma sequência gravada (por exemplo, capturada nas ferramentas do navegador)
+    python scripts/load_test.py --dash-url http://127.0.0.1:8050 --sequence seq.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import threading
+from datetime import date, timedelta
+from collections import defaultdict
+
+import numpy as np
+import requests
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DASH_PORT = 8060
+API_PORT = 5061
+
+# Primeiro output de cada callback -> nome usado no relatório
+CALLBACK_NAMES = {
+    'intermediate-data-store.data': 'update_data_store',
+    'date-picker-range.min_date_allowed': 'update_filters',
+    'time-series-graph.figure': 'update_graphs',
+    'columnar-data-store.data': 'update_columnar_payload',
+    'search-mask-store.data': 'update_search_mask',
+    'bar-offsets.data': 'update_bar_offsets',
+}
+# Callbacks do servidor que alimentam os gráficos quando eles rodam no navegador (CLIENTSIDE_FILTERING)
+CLIENTSIDE_GRAPH_CALLBACKS = ['update_columnar_payload', 'update_search_mask', 'update_bar_offsets']
+FILTER_IDS = ['oficio-filter', 'pretensao-filter', 'materia-filter', 'usuario-filter']
+SEARCH_TERMS = ['maria', 'silva', 'jose', 'beneficio', 'saude']
+
+
+# --- Servidores locais ---
+
+def start_servers(workers, threads):
+    """Sobe o dashboard e a API (com SQLite como substituto do PostgreSQL) via gunicorn."""
+    env = dict(os.environ)
+    env['DATABASE_URL'] = env.get('DATABASE_URL', f"sqlite:///{os.path.join(project_root, 'data', 'loadtest.db')}")
+    env['PRELOAD_DATA'] = env.get('PRELOAD_DATA', 'true')
+
+    print(f"Preparando banco de dados de teste ({env['DATABASE_URL']})...")
+    subprocess.run([sys.executable, 'api/create_tables.py'], cwd=project_root, env=env, check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([sys.executable, 'api/populate_db.py'], cwd=project_root, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    common = ['--workers', str(workers), '--threads', str(threads), '--log-level', 'warning']
+    processes = [
+        subprocess.Popen(['gunicorn', 'src.app:server', '--preload', '--bind', f'127.0.0.1:{DASH_PORT}'] + common, cwd=project_root, env=env),
+        subprocess.Popen(['gunicorn', 'api.main:app', '--bind', f'127.0.0.1:{API_PORT}'] + common, cwd=project_root, env=env),
+    ]
+    dash_url, api_url = f'http://127.0.0.1:{DASH_PORT}', f'http://127.0.0.1:{API_PORT}'
+    try:
+        wait_until_ready([f'{dash_url}/_dash-layout', f'{api_url}/api/health'], processes)
+    except RuntimeError:
+        stop_servers(processes)
+        raise
+    return processes, dash_url, api_url
+
+
+def wait_until_ready(urls, processes, timeout=60):
+    deadline = time.time() + timeout
+    for url in urls:
+        while True:
+            try:
+                if requests.get(url, timeout=2).ok:
+                    break
+            except requests.ConnectionError:
+                pass
+            if any(p.poll() is not None for p in processes):
+                raise RuntimeError("Um dos servidores encerrou durante a inicialização")
+            if time.time() > deadline:
+                raise RuntimeError(f"Servidor não respondeu a tempo: {url}")
+            time.sleep(0.5)
+
+
+def stop_servers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait(timeout=30)
+
+
+# --- Montagem das requisições Dash ---
+
+def _output_spec(output):
+    # "..a.b...c.d.." (múltiplos outputs) ou "a.b" (um output)
+    if output.startswith('..'):
+        specs = [o.rsplit('.', 1) for o in output.strip('.').split('...')]
+        return [{'id': i, 'property': p} for i, p in specs]
+    component_id, prop = output.rsplit('.', 1)
+    return {'id': component_id, 'property': prop}
+
+
+def load_callbacks(session, dash_url):
+    """Callbacks do servidor indexados pelo nome do relatório (ignora os clientside)."""
+    dependencies = session.get(f'{dash_url}/_dash-dependencies', timeout=10).json()
+    callbacks = {}
+    for dep in dependencies:
+        if dep.get('clientside_function'):
+            continue
+        outputs = _output_spec(dep['output'])
+        first = outputs[0] if isinstance(outputs, list) else outputs
+        name = CALLBACK_NAMES.get(f"{first['id']}.{first['property']}", dep['output'])
+        callbacks[name] = {'output': dep['output'], 'outputs': outputs, 'inputs': dep['inputs'], 'state': dep['state']}
+    return callbacks
+
+
+def build_request(callback, values, changed):
+    """Corpo JSON de `_dash-update-component` com os valores atuais dos componentes."""
+    def with_values(deps):
+        return [dict(d, value=values.get(f"{d['id']}.{d['property']}")) for d in deps]
+    return {
+        'output': callback['output'],
+        'outputs': callback['outputs'],
+        'inputs': with_values(callback['inputs']),
+        'state': with_values(callback['state']),
+        'changedPropIds': changed,
+    }
+
+
+def apply_response(values, body):
+    for component_id, props in body.get('response', {}).items():
+        for prop, value in props.items():
+            values[f'{component_id}.{prop}'] = value
+
+
+def synthesize_sequence(session, dash_url, callbacks, steps, rng):
+    """Percorre o app como um analista faria e grava as requisições enviadas.
+
+    A sequência resultante pode ser salva e reproduzida depois com --sequence.
+    """
+    values = {'data-source-selector.value': 'local_excel', 'upload-mode.value': 'replace'}
+    sequence = []
+
+    def call(name, changed):
+        payload = build_request(callbacks[name], values, changed)
+        sequence.append({'name': name, 'payload': payload})
+        response = session.post(f'{dash_url}/_dash-update-component', json=payload, timeout=60)
+        response.raise_for_status()
+        if response.status_code != 204: # 204: callback sem atualização (PreventUpdate)
+            apply_response(values, response.json())
+
+    def call_graphs(changed):
+        if 'update_graphs' in callbacks:
+            call('update_graphs', changed)
+            return
+        # Gráficos no navegador: só os callbacks do servidor acionados pela mudança
+        for name in CLIENTSIDE_GRAPH_CALLBACKS:
+            inputs = callbacks.get(name, {}).get('inputs', [])
+            if any(f"{d['id']}.{d['property']}" in changed for d in inputs):
+                call(name, changed)
+
+    call('update_data_store', ['data-source-selector.value'])
+    call('update_filters', ['intermediate-data-store.data'])
+    call_graphs(['intermediate-data-store.data'])
+
+    min_date = date.fromisoformat(values['date-picker-range.min_date_allowed'][:10])
+    max_date = date.fromisoformat(values['date-picker-range.max_date_allowed'][:10])
+    span = max((max_date - min_date).days, 1)
+    for _ in range(steps):
+        action = rng.choice(['dates', 'filter', 'filter', 'search', 'clear'])
+        if action == 'dates':
+            start = min_date + timedelta(days=rng.randrange(span))
+            end = min(start + timedelta(days=rng.randrange(1, span + 1)), max_date)
+            values['date-picker-range.start_date'] = start.isoformat()
+            values['date-picker-range.end_date'] = end.isoformat()
+            changed = ['date-picker-range.start_date']
+        elif action == 'filter':
+            filter_id = rng.choice(FILTER_IDS)
+            options = [o['value'] for o in values.get(f'{filter_id}.options') or []]
+            values[f'{filter_id}.value'] = rng.sample(options, k=min(len(options), rng.randint(1, 3)))
+            changed = [f'{filter_id}.value']
+        elif action == 'search':
+            values['text-search.value'] = rng.choice(SEARCH_TERMS)
+            changed = ['text-search.value']
+        else:
+            for filter_id in FILTER_IDS:
+                values[f'{filter_id}.value'] = []
+            values['text-search.value'] = None
+            changed = [f'{FILTER_IDS[0]}.value']
+        call_graphs(changed)
+    return sequence
+
+
+# --- Execução ---
+
+def run_user(dash_url, api_url, sequence, api_every, deadline, results, lock):
+    session = requests.Session()
+    local = defaultdict(list)
+    errors = defaultdict(int)
+    i = 0
+    while time.time() < deadline:
+        for step in sequence:
+            if time.time() >= deadline:
+                break
+            name = step['name']
+            started = time.perf_counter()
+            try:
+                response = session.post(f'{dash_url}/_dash-update-component', json=step['payload'], timeout=60)
+                ok = response.status_code in (200, 204)
+            except requests.RequestException:
+                ok = False
+            if ok:
+                local[name].append(time.perf_counter() - started)
+            else:
+                errors[name] += 1
+            i += 1
+            if api_url and api_every and i % api_every == 0:
+                for route in ('/api/health', '/api/data'):
+                    started = time.perf_counter()
+                    try:
+                        ok = session.get(f'{api_url}{route}', timeout=60).ok
+                    except requests.RequestException:
+                        ok = False
+                    if ok:
+                        local[f'API {route}'].append(time.perf_counter() - started)
+                    else:
+                        errors[f'API {route}'] += 1
+    with lock:
+        for name, latencies in local.items():
+            results['latencies'][name].extend(latencies)
+        for name, count in errors.items():
+            results['errors'][name] += count
+
+
+def report(results, elapsed):
+    names = sorted(set(results['latencies']) | set(results['errors']))
+    total = sum(len(v) for v in results['latencies'].values())
+    print(f"\nDuração: {elapsed:.1f}s | Requisições bem-sucedidas: {total} | Vazão total: {total / elapsed:.1f} req/s\n")
+    print(f"{'Callback/Rota':<28}{'Reqs':>8}{'Erros':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in names:
+        latencies = np.array(results['latencies'].get(name, [])) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (float('nan'),) * 3
+        print(f"{name:<28}{len(latencies):>8}{results['errors'].get(name, 0):>8}{len(latencies) / elapsed:>9.1f}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do dashboard SISDPU e da API de dados.")
+    parser.add_argument('--start-servers', action='store_true', help="Sobe dashboard e API localmente com gunicorn (API sobre SQLite)")
+    parser.add_argument('--workers', type=int, default=4, help="Workers do gunicorn ao usar --start-servers")
+    parser.add_argument('--threads', type=int, default=4, help="Threads por worker ao usar --start-servers")
+    parser.add_argument('--dash-url', default=f'http://127.0.0.1:{DASH_PORT}')
+    parser.add_argument('--api-url', default=f'http://127.0.0.1:{API_PORT}', help="Vazio para não exercitar a API")
+    parser.add_argument('--users', type=int, default=8, help="Usuários virtuais simultâneos")
+    parser.add_argument('--duration', type=float, default=30, help="Duração do teste em segundos")
+    parser.add_argument('--steps', type=int, default=20, help="Interações por sequência sintetizada")
+    parser.add_argument('--api-every', type=int, default=10, help="Chamadas à API a cada N requisições do dashboard (0 desativa)")
+    parser.add_argument('--sequence', help="Arquivo JSON com uma sequência gravada para reproduzir")
+    parser.add_argument('--save-sequence', help="Grava a sequência sintetizada neste arquivo")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    processes = []
+    dash_url, api_url = args.dash_url.rstrip('/'), args.api_url.rstrip('/')
+    if args.start_servers:
+        processes, dash_url, api_url = start_servers(args.workers, args.threads)
+    try:
+        if args.sequence:
+            with open(args.sequence) as f:
+                sequences = [json.load(f)]
+        else:
+            # Cada usuário virtual recebe sua própria sequência, para variar filtros e datas
+            session = requests.Session()
+            callbacks = load_callbacks(session, dash_url)
+            rng = random.Random(args.seed)
+            sequences = [synthesize_sequence(session, dash_url, callbacks, args.steps, random.Random(rng.random())) for _ in range(args.users)]
+            if 'update_graphs' not in callbacks:
+                print("CLIENTSIDE_FILTERING ativo: filtros e gráficos rodam no navegador; "
+                      f"medindo apenas os callbacks do servidor ({', '.join(CLIENTSIDE_GRAPH_CALLBACKS)}).")
+            if args.save_sequence:
+                with open(args.save_sequence, 'w') as f:
+                    json.dump(sequences[0], f, ensure_ascii=False)
+
+        print(f"Iniciando {args.users} usuários virtuais por {args.duration:.0f}s contra {dash_url}...")
+        results = {'latencies': defaultdict(list), 'errors': defaultdict(int)}
+        lock = threading.Lock()
+        started = time.time()
+        deadline = started + args.duration
+        users = [
+            threading.Thread(target=run_user, args=(dash_url, api_url, sequences[i % len(sequences)], args.api_every, deadline, results, lock))
+            for i in range(args.users)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        report(results, time.time() - started)
+    finally:
+        if processes:
+            stop_servers(processes)
+
+
+if __name__ == '__main__':
+    main()
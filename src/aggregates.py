@@ -0,0 +1,130 @@
+# src/aggregates.py
+"""Agregados por conjunto de dados: contagens por dia e por coluna categórica.
+
+Os agregados do conjunto completo alimentam as opções dos filtros e as figuras sem
+filtros. Como o conteúdo de cada chave (e versão, para fontes externas) é imutável,
+eles são calculados uma vez por chave; numa mesclagem (upload em modo "acrescentar") os agregados do novo
+conjunto são derivados dos anteriores aplicando apenas a diferença.
+"""
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from src.datasets import (
+    DATE_COLUMN, UNIT_COLUMN, DATASET_CACHE_SIZE, get_dataset, is_dataset_key, base_key_of, versioned_name, save_to_disk, load_from_disk,
+)
+
+CATEGORY_COLUMNS = ['Oficio', 'Tipo de Pretensão', 'Materia', 'Usuário']
+# Os agregados do conjunto completo também contam as Unidades (opções do seletor de Unidade)
+SUMMARY_COLUMNS = CATEGORY_COLUMNS + [UNIT_COLUMN]
+
+_summaries = OrderedDict()
+_lock = threading.Lock()
+# Cálculo alternativo dos agregados completos (ex.: DuckDB): função(chave) -> contagens ou None
+_summary_engine = None
+
+
+def observed_value_counts(series):
+    """value_counts ignorando categorias sem ocorrências (colunas categóricas).
+
+    Sem ordenar: as figuras escolhem só as maiores contagens (ver top_positions em src/figures.py).
+    """
+    counts = series.value_counts(sort=False)
+    counts = counts[counts > 0]
+    counts.index = counts.index.astype(str)
+    return counts
+
+
+def compute_counts(df, columns=CATEGORY_COLUMNS):
+    """Contagens por dia e por coluna categórica de um DataFrame (filtrado ou não)."""
+    df = df.dropna(subset=[DATE_COLUMN])
+    day_counts = df.groupby(df[DATE_COLUMN].dt.date).size()
+    day_counts.index.name = DATE_COLUMN
+    columns = {c: observed_value_counts(df[c]) for c in columns if c in df.columns}
+    return {'total': int(len(df)), 'days': day_counts, 'columns': columns}
+
+
+def _combine(old, delta, sign):
+    combined = old.add(sign * delta, fill_value=0)
+    return combined[combined > 0].astype('int64')
+
+
+def apply_delta(counts, removed, added):
+    """Novas contagens a partir das anteriores, subtraindo `removed` e somando `added`."""
+    removed_counts = compute_counts(removed, list(counts['columns']))
+    added_counts = compute_counts(added, list(counts['columns']))
+    days = _combine(_combine(counts['days'], removed_counts['days'], -1), added_counts['days'], 1).sort_index()
+    days.index.name = DATE_COLUMN
+    columns = {}
+    for column, old in counts['columns'].items():
+        new = _combine(old, removed_counts['columns'].get(column, pd.Series(dtype='int64')), -1)
+        columns[column] = _combine(new, added_counts['columns'].get(column, pd.Series(dtype='int64')), 1)
+    total = counts['total'] - removed_counts['total'] + added_counts['total']
+    return {'total': int(total), 'days': days, 'columns': columns}
+
+
+def _summary_name(key):
+    # Fontes externas (planilha local, API) mudam sob a mesma chave: o arquivo leva a versão do conteúdo
+    return f"{versioned_name(key)}.summary"
+
+
+def _remember(key, summary):
+    with _lock:
+        _summaries[key] = summary
+        _summaries.move_to_end(key)
+        while len(_summaries) > DATASET_CACHE_SIZE:
+            _summaries.popitem(last=False)
+
+
+def set_summary_engine(compute):
+    """Faz get_summary calcular os agregados ainda não gravados com `compute(key)` em vez do pandas."""
+    global _summary_engine
+    _summary_engine = compute
+
+
+def register_summary(key, summary):
+    save_to_disk(_summary_name(key), summary)
+    _remember(key, summary)
+
+
+def get_summary(key):
+    """Agregados do conjunto completo (None se o conjunto não existir)."""
+    if not is_dataset_key(key):
+        return None
+    with _lock:
+        if key in _summaries:
+            _summaries.move_to_end(key)
+            return _summaries[key]
+    summary = load_from_disk(_summary_name(key))
+    if summary is not None:
+        _remember(key, summary)
+        return summary
+    if _summary_engine is not None:
+        summary = _summary_engine(key)
+    else:
+        df = get_dataset(key, remember=False) # Calculados uma vez e gravados: o conjunto não precisa ficar em memória
+        summary = compute_counts(df, SUMMARY_COLUMNS) if df is not None else None
+    if summary is None:
+        return None
+    register_summary(key, summary)
+    return summary
+
+
+def invalidate_summary(key):
+    """Descarta os agregados de `key` e de suas partições por Unidade neste processo."""
+    with _lock:
+        for cached_key in [k for k in _summaries if base_key_of(k) == key]:
+            del _summaries[cached_key]
+
+
+def update_summary(base_key, key, removed, added):
+    """Deriva os agregados de `key` a partir dos de `base_key` e da diferença aplicada."""
+    if key == base_key:
+        return get_summary(key)
+    base_summary = get_summary(base_key)
+    if base_summary is None:
+        return get_summary(key)
+    summary = apply_delta(base_summary, removed, added)
+    register_summary(key, summary)
+    return summary
@@ -0,0 +1,184 @@
+# src/api_source.py
+"""Fonte de dados "API (PostgreSQL)" do dashboard, com invalidação por LISTEN/NOTIFY.
+
+O conjunto vem de GET {API_URL}/api/data e fica em memória sob a chave API_KEY,
+como a planilha local. A API e o script de carga (api/populate_db.py) incrementam a
+versão dos dados a cada alteração de paj_data e a anunciam com NOTIFY no canal
+DATA_CHANGED_CHANNEL. Cada processo do dashboard que usa a fonte API mantém uma
+thread em LISTEN nesse canal: ao saber de uma versão mais nova que a carregada,
+descarta apenas o conjunto e os agregados da API naquele processo, e o próximo
+acesso busca os dados novos. Nenhum recarregamento periódico é feito; os
+navegadores só consultam o número da versão conhecida pelo servidor.
+
+A busca textual usa GET {API_URL}/api/search, atendida pelos índices GIN de
+trigramas do PostgreSQL (ver api/create_tables.py).
+"""
+import os
+import select
+import threading
+import time
+from functools import lru_cache
+
+import pandas as pd
+import requests
+
+from src.datasets import DATE_COLUMN, compact_frame, register_source, invalidate_dataset
+from src.aggregates import invalidate_summary
+from src.search import register_search
+
+API_KEY = 'api'
+API_URL = os.getenv("API_URL", "http://localhost:5001")
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "30")) # segundos
+
+# Mesma configuração de banco e canal da API (api/main.py)
+DB_USERNAME = os.getenv("DB_USERNAME", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "password")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_NAME = os.getenv("DB_NAME", "sisdpu_db")
+DATABASE_URL = os.getenv("DATABASE_URL", f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+DATA_CHANGED_CHANNEL = os.getenv("DATA_CHANGED_CHANNEL", "paj_data_changed")
+
+LISTEN_RETRY_SECONDS = 5
+LISTEN_KEEPALIVE_SECONDS = 30
+
+_loaded_version = None # Versão do conjunto em memória neste processo
+_latest_version = 0 # Maior versão anunciada (resposta da API ou NOTIFY)
+_version_lock = threading.Lock()
+_listener_pid = None
+
+
+def load_api_dataset():
+    """Busca o conjunto completo na API (chamado por get_dataset na primeira vez e após cada invalidação)."""
+    global _loaded_version, _latest_version
+    start_listener()
+    response = requests.get(f"{API_URL}/api/data", timeout=API_TIMEOUT)
+    response.raise_for_status()
+    version = int(response.headers.get('X-Data-Version', 0))
+    df = pd.DataFrame(response.json())
+    if DATE_COLUMN not in df.columns: # Tabela vazia
+        return None
+    df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], errors='coerce', format='ISO8601')
+    with _version_lock:
+        _loaded_version = version
+        _latest_version = max(_latest_version, version)
+    return compact_frame(df)
+
+
+def current_version():
+    """Versão dos dados em memória; sem dados carregados, a mais nova conhecida.
+
+    Permite que um worker use partições e agregados gravados em disco por outro
+    worker sem buscar o conjunto completo na API.
+    """
+    if _loaded_version is not None:
+        return _loaded_version
+    start_listener()
+    if _latest_version == 0: # Nenhuma versão conhecida ainda neste processo
+        try:
+            response = requests.get(f"{API_URL}/api/version", timeout=API_TIMEOUT)
+            response.raise_for_status()
+            announce_version(int(response.json()['version']))
+        except Exception as e:
+            print(f"Erro ao consultar a versão dos dados da API: {e}")
+    return _latest_version
+
+
+def latest_version():
+    """Versão mais nova conhecida. Se o conjunto em memória estiver atrás dela, ele é descartado."""
+    global _loaded_version
+    with _version_lock:
+        stale = _loaded_version is not None and _loaded_version < _latest_version
+        if stale:
+            _loaded_version = None
+        latest = _latest_version
+    if stale:
+        invalidate_dataset(API_KEY)
+        invalidate_summary(API_KEY)
+        print(f"Dados da API alterados (versão {latest}): cache local descartado.")
+    return latest
+
+
+def announce_version(version):
+    global _latest_version
+    with _version_lock:
+        _latest_version = max(_latest_version, version)
+    latest_version()
+
+
+def _dsn():
+    # URL no formato do SQLAlchemy (postgresql+driver://...) -> DSN do libpq
+    scheme, _, rest = DATABASE_URL.partition('://')
+    return f"{scheme.split('+')[0]}://{rest}"
+
+
+def _listen():
+    import psycopg2
+    import psycopg2.extensions
+
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(_dsn())
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            cursor = conn.cursor()
+            cursor.execute(f'LISTEN "{DATA_CHANGED_CHANNEL}"')
+            # Alterações feitas enquanto não estávamos escutando (início ou reconexão)
+            try:
+                cursor.execute("SELECT version FROM paj_data_version WHERE id = 1")
+                row = cursor.fetchone()
+                if row:
+                    announce_version(row[0])
+            except psycopg2.errors.UndefinedTable:
+                pass # Nenhuma carga registrou versão ainda
+            while True:
+                if not select.select([conn], [], [], LISTEN_KEEPALIVE_SECONDS)[0]:
+                    cursor.execute("SELECT 1") # Detecta conexões derrubadas enquanto ociosas
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        announce_version(int(notify.payload))
+                    except ValueError:
+                        print(f"Notificação inválida em {DATA_CHANGED_CHANNEL}: {notify.payload!r}")
+        except Exception as e:
+            print(f"Erro ao escutar {DATA_CHANGED_CHANNEL} ({e}); nova tentativa em {LISTEN_RETRY_SECONDS}s.")
+        finally:
+            if conn is not None:
+                conn.close()
+        time.sleep(LISTEN_RETRY_SECONDS)
+
+
+def start_listener():
+    """Inicia a thread de LISTEN deste processo (uma por worker; threads não sobrevivem ao fork)."""
+    global _listener_pid
+    with _version_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+    if not DATABASE_URL.startswith('postgres'):
+        print("Banco de dados da API não é PostgreSQL: invalidação por LISTEN/NOTIFY desativada.")
+        return
+    threading.Thread(target=_listen, name='sisdpu-data-listener', daemon=True).start()
+
+
+
+@lru_cache(maxsize=256)
+def _search_paj(version, terms):
+    response = requests.get(f"{API_URL}/api/search", params={'q': ' '.join(terms)}, timeout=API_TIMEOUT)
+    response.raise_for_status()
+    return frozenset(response.json()['paj'])
+
+
+def search_api(terms):
+    """PAJs encontrados pela busca na API (cache por versão dos dados); None em caso de erro."""
+    try:
+        return _search_paj(current_version(), terms)
+    except Exception as e:
+        print(f"Erro na busca textual pela API ({e}); usando o índice em memória.")
+        return None
+
+
+register_source(API_KEY, load_api_dataset, current_version)
+register_search(API_KEY, search_api)
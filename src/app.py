@@ -2,12 +2,13 @@ import dash
 import dash_bootstrap_components as dbc
 from dash import html, dcc
 import pandas as pd
-import plotly.express as px
+import numpy as np
 from datetime import datetime
 
 # Inicializa o aplicativo Dash
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 app.title = "Análise de Dados SISDPU"
+server = app.server # Ponto de entrada WSGI (gunicorn src.app:server)
 
 # Layout do aplicativo
 app.layout = dbc.Container(
@@ -57,7 +58,20 @@ app.layout = dbc.Container(
                             multiple=False,
                             # Aceita apenas arquivos .xlsx
                             accept=".xlsx"
-                        )
+                        ),
+                        dcc.RadioItems(
+                            id='upload-mode',
+                            options=[
+                                {'label': 'Substituir dados atuais', 'value': 'replace'},
+                                {'label': 'Acrescentar/mesclar aos dados atuais (por PAJ)', 'value': 'append'}
+                            ],
+                            value='replace',
+                            labelStyle={'display': 'inline-block', 'margin-right': '20px'}
+                        ),
+                        # Carrega apenas os PAJs da Unidade escolhida (partição do conjunto atual)
+                        dcc.Dropdown(id='unidade-selector', placeholder="Todas as Unidades", className="mt-2"),
+                        # Unidade escolhida, salva no navegador: as próximas visitas já começam só com a partição dela
+                        dcc.Store(id='saved-unit', storage_type='local')
                     ], width=10
                 )
             ], className="mb-4", align="center"
@@ -93,6 +107,42 @@ app.layout = dbc.Container(
             ], className="mb-4"
         ),
 
+        # Busca textual (substring, sem diferenciar maiúsculas e acentos) em Assistido e Pretensão
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        html.H5("Busca por Assistido ou Pretensão"),
+                        dcc.Input(id='text-search', type='search', debounce=True,
+                                  placeholder="Digite um ou mais termos (todos precisam aparecer)", className="form-control"),
+                    ], md=12
+                )
+            ], className="mb-4"
+        ),
+
+        # Exportação das linhas correspondentes aos filtros atuais
+        dbc.Row(
+            [
+                dbc.Col(
+                    [
+                        html.H5("Exportar Dados Filtrados"),
+                        dcc.RadioItems(
+                            id='export-format',
+                            options=[
+                                {'label': 'CSV', 'value': 'csv'},
+                                {'label': 'Excel (XLSX)', 'value': 'xlsx'},
+                                {'label': 'Parquet', 'value': 'parquet'}
+                            ],
+                            value='csv',
+                            labelStyle={'display': 'inline-block', 'margin-right': '20px'}
+                        ),
+                        html.A("Baixar dados filtrados", id='export-link', href='', target='_blank', className="btn btn-outline-secondary mt-2"),
+                        dcc.Store(id='export-base-url', data=app.get_relative_path('/export')),
+                    ], md=12
+                )
+            ], className="mb-4"
+        ),
+
         # Gráficos
         dbc.Row(
             [
@@ -111,31 +161,67 @@ app.layout = dbc.Container(
                 dbc.Col(dcc.Graph(id='usuario-dist-graph'), md=6, className="mb-4"),
             ]
         ),
-        # Armazenamento de dados intermediários
-        dcc.Store(id='intermediate-data-store')
+        # Armazenamento de dados intermediários: só a chave do conjunto, a versão e a Unidade (vai e volta nos callbacks)
+        dcc.Store(id='intermediate-data-store'),
+        # Payload colunar do modo clientside: lido apenas pelo callback de gráficos no navegador, nunca reenviado ao servidor
+        dcc.Store(id='columnar-data-store'),
+        # Linhas encontradas pela busca textual no modo clientside (bits empacotados, ver build_search_mask)
+        dcc.Store(id='search-mask-store'),
+        # Conjunto completo para o qual o intervalo de datas foi definido: só uma troca de conjunto o reinicia
+        dcc.Store(id='date-range-base'),
+        # Página exibida em cada gráfico de barras (coluna -> deslocamento no ranking), alterada ao clicar em "Outros"
+        dcc.Store(id='bar-offsets', data={}),
+        # Consulta a versão dos dados da API conhecida pelo servidor (ativo só com a fonte API)
+        dcc.Interval(id='data-version-poll', interval=5 * 1000, disabled=True)
     ],
     fluid=True
 )
 
 # Callbacks serão adicionados aqui
 
-if __name__ == '__main__':
-    app.run_server(debug=True, host='0.0.0.0')
-
-
 
 import io
+import os
+import sys
 import base64
-from dash.dependencies import Input, Output, State
-
-# --- Cores DPU (extraídas anteriormente) ---
-DPU_COLORS = {
-    "primary_green": "#4d9529",
-    "primary_teal": "#00898f",
-    "dark_gray": "#373737",
-    "light_gray": "#f0f0f0", # Adicionando uma cor clara para fundos ou elementos secundários
-    "white": "#ffffff"
-}
+import flask
+from functools import lru_cache
+from dash.dependencies import Input, Output, State, ClientsideFunction
+
+# Adicionar o diretório raiz do projeto ao sys.path (mesmo padrão usado em api/)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.columnar import FILTER_COLUMNS, encode_columnar
+from src.export import EXPORT_FORMATS, export_response
+from src.figures import BAR_LIMITS, PAGE_PREVIOUS, PAGE_NEXT, figures_from_counts, empty_figures
+from src.datasets import (
+    LOCAL_EXCEL_KEY, UNIT_COLUMN, get_dataset, is_dataset_key, register_dataset, append_dataset, content_key, filter_mask,
+    base_key_of, unit_key, partition_units, preload_default_dataset, freeze_shared_memory,
+)
+from src.aggregates import compute_counts, get_summary, update_summary, set_summary_engine
+from src.search import search_terms, search_mask, get_index, extend_index
+from src import api_source
+from src.api_source import API_KEY
+
+# Quando habilitado, o Store recebe a representação colunar compacta e a
+# filtragem/contagem dos gráficos roda no navegador (assets/clientside_filter.js)
+CLIENTSIDE_FILTERING = os.getenv("CLIENTSIDE_FILTERING", "false").lower() in ("1", "true", "yes")
+
+# Quando habilitado, a planilha local é carregada e as figuras padrão são
+# pré-renderizadas na importação do módulo (no mestre, com gunicorn --preload)
+PRELOAD_DATA = os.getenv("PRELOAD_DATA", "false").lower() in ("1", "true", "yes")
+
+# Número de combinações de filtros cujas figuras ficam em cache por processo
+FIGURE_CACHE_SIZE = int(os.getenv("FIGURE_CACHE_SIZE", "64"))
+
+# Motor das agregações filtradas: 'pandas' (padrão, em memória) ou 'duckdb' (src/duckdb_engine.py)
+QUERY_ENGINE = os.getenv("QUERY_ENGINE", "pandas").lower()
+if QUERY_ENGINE == 'duckdb':
+    from src import duckdb_engine
+    # Os agregados do conjunto completo também saem do DuckDB
+    set_summary_engine(duckdb_engine.summary_counts)
 
 # --- Funções Auxiliares ---
 def parse_contents(contents, filename):
@@ -153,15 +239,50 @@ def parse_contents(contents, filename):
     return df
 
 def load_local_excel_data():
-    try:
-        df = pd.read_excel("data/tratado_filtrado.xlsx")
-        # Assegurar que a coluna de data está no formato correto e é datetime
-        if 'Data de Abertura do PAJ' in df.columns:
-            df['Data de Abertura do PAJ'] = pd.to_datetime(df['Data de Abertura do PAJ'], errors='coerce', dayfirst=True)
-        return df
-    except Exception as e:
-        print(f"Erro ao carregar planilha local: {e}")
-        return pd.DataFrame() # Retorna DataFrame vazio em caso de erro
+    # A planilha local é lida uma única vez por processo (ou no mestre, se pré-carregada)
+    df = get_dataset(LOCAL_EXCEL_KEY)
+    return df if df is not None else pd.DataFrame() # Retorna DataFrame vazio em caso de erro
+
+def store_version(dataset_key):
+    """Versão do conteúdo sob a chave: muda quando a API anuncia dados novos (0 para as demais chaves)."""
+    if dataset_key is None or base_key_of(dataset_key) != API_KEY:
+        return 0
+    api_source.latest_version() # Descarta o conjunto em memória se houver versão mais nova
+    get_dataset(dataset_key) # Carrega (se preciso) para que a versão retornada seja a dos dados em memória
+    return api_source.latest_version()
+
+def build_store_data(dataset_key, version):
+    """Conteúdo do Store: a chave (e a do conjunto completo, se for uma Unidade) e a versão."""
+    if dataset_key is None:
+        return None
+    return {'dataset': dataset_key, 'base': base_key_of(dataset_key), 'version': version}
+
+@lru_cache(maxsize=8)
+def build_columnar_payload(dataset_key, version):
+    """Payload colunar do modo clientside (ver src/columnar.py), com a chave e a versão a que corresponde."""
+    df = get_dataset(dataset_key)
+    payload = encode_columnar(df) if df is not None else None
+    if payload is not None:
+        payload.update({'dataset': dataset_key, 'version': version, 'bar_limits': BAR_LIMITS})
+    return payload
+
+def checked_store(data):
+    """Conteúdo do Store vindo do navegador, ou None se as chaves não tiverem o formato gerado pelo servidor."""
+    if not data or not is_dataset_key(data.get('dataset')) or not is_dataset_key(data.get('base')):
+        return None
+    return data
+
+def as_filter_key(selected):
+    # Listas do Dropdown viram tuplas para servir de chave do cache de figuras
+    return tuple(selected) if selected else ()
+
+def as_search_key(query):
+    # Consultas equivalentes (maiúsculas, acentos, espaços) compartilham a mesma entrada do cache
+    return ' '.join(search_terms(query))
+
+def as_offsets_key(offsets):
+    # Deslocamentos dos gráficos de barras como tupla ordenada (sem os da primeira página), para a chave do cache
+    return tuple(sorted((column, offset) for column, offset in (offsets or {}).items() if offset))
 
 # --- Callbacks ---
 
@@ -169,46 +290,101 @@ def load_local_excel_data():
 @app.callback(
     Output('intermediate-data-store', 'data'),
     Output('last-update-time', 'children'),
+    Output('data-version-poll', 'disabled'),
+    Output('saved-unit', 'data'),
     Input('data-source-selector', 'value'),
     Input('upload-data', 'contents'),
-    State('upload-data', 'filename')
+    Input('unidade-selector', 'value'),
+    State('upload-data', 'filename'),
+    State('upload-mode', 'value'),
+    State('intermediate-data-store', 'data'),
+    State('saved-unit', 'data')
 )
-def update_data_store(selected_source, uploaded_contents, uploaded_filename):
-    df = pd.DataFrame()
+def update_data_store(selected_source, uploaded_contents, selected_unit, uploaded_filename, upload_mode, current_store_data, saved_unit):
+    dataset_key = None
     trigger_id = dash.callback_context.triggered_id
+    current_store_data = checked_store(current_store_data)
     now_time_str = f"Última atualização: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"
 
-    if trigger_id == 'upload-data' and uploaded_contents is not None:
+    if trigger_id is None:
+        selected_unit = saved_unit # Primeira carga: começa pela Unidade salva no navegador
+    elif trigger_id in ('data-source-selector', 'upload-data'):
+        selected_unit = None # A Unidade escolhida pertence ao conjunto anterior
+
+    if trigger_id == 'unidade-selector' and current_store_data:
+        # Troca só a Unidade: mesmo conjunto completo, outra partição
+        dataset_key = current_store_data['base']
+    elif trigger_id == 'upload-data' and uploaded_contents is not None:
         df = parse_contents(uploaded_contents, uploaded_filename)
         if isinstance(df, html.Div): # Erro no parse
             print("Erro no parse do upload")
             # Mantém os dados anteriores ou carrega o local como fallback?
             # Por enquanto, vamos carregar o local se o upload falhar e a fonte selecionada for upload
             if selected_source == 'upload':
-                 df = load_local_excel_data()
+                 dataset_key = LOCAL_EXCEL_KEY
             # Se não, respeita a seleção atual
             elif selected_source == 'local_excel':
-                 df = load_local_excel_data()
+                 dataset_key = LOCAL_EXCEL_KEY
             # API ainda não implementada
-            # else: df = pd.DataFrame()
+            # else: dataset_key = None
         else:
              if 'Data de Abertura do PAJ' in df.columns:
-                df['Data de Abertura do PAJ'] = pd.to_datetime(df['Data de Abertura do PAJ'], errors='coerce') # Tenta formato padrão primeiro
-                # Se falhar, tenta com dayfirst=True (comum no Brasil)
-                if df['Data de Abertura do PAJ'].isnull().all():
-                    df['Data de Abertura do PAJ'] = pd.to_datetime(parse_contents(uploaded_contents, uploaded_filename)['Data de Abertura do PAJ'], errors='coerce', dayfirst=True)
+                # Mesmo formato da planilha local (dd/mm/aaaa, comum no Brasil), para que as linhas
+                # de uploads mesclados sejam comparáveis com as do conjunto atual
+                df['Data de Abertura do PAJ'] = pd.to_datetime(df['Data de Abertura do PAJ'], errors='coerce', dayfirst=True)
+             # O DataFrame fica no servidor; o Store recebe apenas a chave
+             if upload_mode == 'append' and current_store_data:
+                 # Mescla ao conjunto atual: só os PAJs novos/alterados entram e os agregados são atualizados pela diferença
+                 base_key = current_store_data['base']
+                 merged_key = content_key('merged', f"{base_key}:{uploaded_contents}")
+                 dataset_key, removed, added = append_dataset(base_key, merged_key, df)
+                 update_summary(base_key, dataset_key, removed, added)
+                 extend_index(base_key, dataset_key) # Índice da busca textual: só as categorias novas são indexadas
+             else:
+                 dataset_key = register_dataset(content_key('upload', uploaded_contents), df)
+                 get_index(dataset_key) # O índice da busca textual é montado na carga, não na primeira busca
 
     elif selected_source == 'local_excel':
-        df = load_local_excel_data()
+        dataset_key = LOCAL_EXCEL_KEY
     elif selected_source == 'api':
-        # Lógica para buscar dados da API (será implementada depois)
-        # Por enquanto, retorna DataFrame vazio ou dados locais como placeholder
-        print("Fonte API selecionada, mas ainda não implementada. Carregando dados locais.")
-        df = load_local_excel_data() # Placeholder
+        # Dados da API em cache no servidor, descartados quando a API anuncia uma nova versão (src/api_source.py)
+        dataset_key = API_KEY
     else: # Caso inicial ou upload sem arquivo ainda
-        df = load_local_excel_data()
+        dataset_key = LOCAL_EXCEL_KEY
 
-    return df.to_json(date_format='iso', orient='split'), now_time_str
+    if dataset_key is not None and selected_unit:
+        if get_dataset(unit_key(dataset_key, selected_unit)) is not None:
+            dataset_key = unit_key(dataset_key, selected_unit)
+        else:
+            selected_unit = None # Unidade inexistente neste conjunto (ex.: salva quando outra fonte estava ativa)
+    if trigger_id == 'unidade-selector' and current_store_data and dataset_key == current_store_data['dataset']:
+        # O seletor só foi sincronizado com o Store (ver update_unit_options): nada muda
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    store_data = build_store_data(dataset_key, store_version(dataset_key))
+    if store_data is not None:
+        store_data = dict(store_data, unit=selected_unit) # Nome da Unidade (a chave guarda apenas o hash)
+    return store_data, now_time_str, base_key_of(dataset_key or '') != API_KEY, selected_unit
+
+# Com a fonte API, atualiza o Store quando o servidor souber de uma versão mais nova dos dados
+@app.callback(
+    Output('intermediate-data-store', 'data', allow_duplicate=True),
+    Output('last-update-time', 'children', allow_duplicate=True),
+    Input('data-version-poll', 'n_intervals'),
+    State('intermediate-data-store', 'data'),
+    prevent_initial_call=True
+)
+def refresh_api_data(n_intervals, store_data):
+    store_data = checked_store(store_data)
+    if not store_data or store_data['base'] != API_KEY:
+        return dash.no_update, dash.no_update
+    # Apenas compara números: nenhum dado é recarregado. current_version (e não latest_version) para que um
+    # worker que ainda não conhece a versão a consulte, em vez de tratar 0 como versão nova e reenviar o Store
+    if api_source.current_version() == store_data.get('version'):
+        return dash.no_update, dash.no_update
+    now_time_str = f"Última atualização: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}"
+    dataset_key = store_data['dataset']
+    refreshed = build_store_data(dataset_key, store_version(dataset_key))
+    return (dict(refreshed, unit=store_data.get('unit')) if refreshed is not None else None), now_time_str
 
 # Callback para atualizar os filtros com base nos dados carregados
 @app.callback(
@@ -221,140 +397,280 @@ def update_data_store(selected_source, uploaded_contents, uploaded_filename):
     Output('pretensao-filter', 'options'),
     Output('materia-filter', 'options'),
     Output('usuario-filter', 'options'),
-    Input('intermediate-data-store', 'data')
+    Output('date-range-base', 'data'),
+    Input('intermediate-data-store', 'data'),
+    State('date-picker-range', 'start_date'),
+    State('date-picker-range', 'end_date'),
+    State('date-range-base', 'data')
 )
-def update_filters(jsonified_cleaned_data):
+def update_filters(jsonified_cleaned_data, current_start, current_end, date_range_base):
+    jsonified_cleaned_data = checked_store(jsonified_cleaned_data)
     if not jsonified_cleaned_data:
         # Valores padrão se não houver dados
         default_date = datetime.now().date()
         min_date = datetime(2000, 1, 1).date()
         empty_options = []
-        return min_date, default_date, min_date, default_date, default_date, empty_options, empty_options, empty_options, empty_options
-
-    df = pd.read_json(jsonified_cleaned_data, orient='split')
-    if df.empty or 'Data de Abertura do PAJ' not in df.columns:
-        default_date = datetime.now().date()
-        min_date = datetime(2000, 1, 1).date()
-        empty_options = []
-        return min_date, default_date, min_date, default_date, default_date, empty_options, empty_options, empty_options, empty_options
+        return min_date, default_date, min_date, default_date, default_date, empty_options, empty_options, empty_options, empty_options, None
 
-    # Converte a coluna de data para datetime se ainda não for
-    df['Data de Abertura do PAJ'] = pd.to_datetime(df['Data de Abertura do PAJ'], errors='coerce')
-    df = df.dropna(subset=['Data de Abertura do PAJ']) # Remove linhas onde a data não pôde ser convertida
-
-    if df.empty:
+    # Datas e opções vêm dos agregados do conjunto (calculados uma vez por chave)
+    summary = get_summary(jsonified_cleaned_data['dataset'])
+    if summary is None or summary['total'] == 0:
         default_date = datetime.now().date()
         min_date = datetime(2000, 1, 1).date()
         empty_options = []
-        return min_date, default_date, min_date, default_date, default_date, empty_options, empty_options, empty_options, empty_options
+        return min_date, default_date, min_date, default_date, default_date, empty_options, empty_options, empty_options, empty_options, None
 
-    min_date_allowed = df['Data de Abertura do PAJ'].min().date()
-    max_date_allowed = df['Data de Abertura do PAJ'].max().date()
+    min_date_allowed = summary['days'].index.min()
+    max_date_allowed = summary['days'].index.max()
     start_date = min_date_allowed
     end_date = max_date_allowed
     initial_visible_month = start_date
-
-    oficio_options = [{'label': i, 'value': i} for i in sorted(df['Oficio'].astype(str).unique())]
-    pretensao_options = [{'label': i, 'value': i} for i in sorted(df['Tipo de Pretensão'].astype(str).unique())]
-    materia_options = [{'label': i, 'value': i} for i in sorted(df['Materia'].astype(str).unique())]
-    usuario_options = [{'label': i, 'value': i} for i in sorted(df['Usuário'].astype(str).unique())]
-
-    return min_date_allowed, max_date_allowed, start_date, end_date, initial_visible_month, oficio_options, pretensao_options, materia_options, usuario_options
+    base_key = jsonified_cleaned_data['base']
+    if base_key == date_range_base and current_start and current_end:
+        # Mesmo conjunto (nova versão da API, outra Unidade): mantém o intervalo escolhido pelo analista
+        start_date, end_date, initial_visible_month = dash.no_update, dash.no_update, dash.no_update
+
+    columns = summary['columns']
+    oficio_options = [{'label': i, 'value': i} for i in sorted(columns['Oficio'].index)]
+    pretensao_options = [{'label': i, 'value': i} for i in sorted(columns['Tipo de Pretensão'].index)]
+    materia_options = [{'label': i, 'value': i} for i in sorted(columns['Materia'].index)]
+    usuario_options = [{'label': i, 'value': i} for i in sorted(columns['Usuário'].index)]
+
+    return min_date_allowed, max_date_allowed, start_date, end_date, initial_visible_month, oficio_options, pretensao_options, materia_options, usuario_options, base_key
+
+# Opções do seletor de Unidade: vêm dos agregados do conjunto completo, sem carregar o conjunto em si.
+# O valor exibido acompanha a Unidade do Store (salva no navegador ou descartada ao trocar de fonte); opções
+# e valor chegam juntos, para que o Dropdown não descarte um valor ausente das opções anteriores.
+@app.callback(
+    Output('unidade-selector', 'options'),
+    Output('unidade-selector', 'value'),
+    Input('intermediate-data-store', 'data'),
+    State('unidade-selector', 'value')
+)
+def update_unit_options(store_data, current_unit):
+    store_data = checked_store(store_data)
+    unit = store_data.get('unit') if store_data else None
+    value = unit if unit != current_unit else dash.no_update
+    if not store_data:
+        return [], value
+    summary = get_summary(store_data['base'])
+    if summary is None or UNIT_COLUMN not in summary['columns']:
+        return [], value
+    return [{'label': f"{unit} ({count})", 'value': unit} for unit, count in sorted(summary['columns'][UNIT_COLUMN].items())], value
 
 # Callback para atualizar os gráficos
-@app.callback(
+GRAPH_OUTPUTS = [
     Output('time-series-graph', 'figure'),
     Output('oficio-dist-graph', 'figure'),
     Output('pretensao-dist-graph', 'figure'),
     Output('materia-dist-graph', 'figure'),
     Output('usuario-dist-graph', 'figure'),
+]
+GRAPH_INPUTS = [
     Input('intermediate-data-store', 'data'),
     Input('date-picker-range', 'start_date'),
     Input('date-picker-range', 'end_date'),
     Input('oficio-filter', 'value'),
     Input('pretensao-filter', 'value'),
     Input('materia-filter', 'value'),
-    Input('usuario-filter', 'value')
-)
-def update_graphs(jsonified_cleaned_data, start_date, end_date, oficio_selected, pretensao_selected, materia_selected, usuario_selected):
-    if not jsonified_cleaned_data:
+    Input('usuario-filter', 'value'),
+    Input('text-search', 'value'),
+]
+# Páginas dos gráficos de barras ("Outros"): só mudam a montagem das figuras, não a filtragem
+BAR_OFFSETS_INPUT = Input('bar-offsets', 'data')
+# Gráfico de barras -> coluna categórica exibida
+BAR_GRAPHS = {
+    'oficio-dist-graph': 'Oficio',
+    'pretensao-dist-graph': 'Tipo de Pretensão',
+    'materia-dist-graph': 'Materia',
+    'usuario-dist-graph': 'Usuário',
+}
+
+def update_graphs(store_data, start_date, end_date, oficio_selected, pretensao_selected, materia_selected, usuario_selected, search_query, bar_offsets):
+    store_data = checked_store(store_data)
+    if not store_data:
         # Retorna figuras vazias se não houver dados
-        empty_fig = {'data': [], 'layout': {'title': 'Sem dados para exibir'}}
-        return empty_fig, empty_fig, empty_fig, empty_fig, empty_fig
-
-    dff = pd.read_json(jsonified_cleaned_data, orient='split')
-    if dff.empty:
-        empty_fig = {'data': [], 'layout': {'title': 'Sem dados para exibir'}}
-        return empty_fig, empty_fig, empty_fig, empty_fig, empty_fig
-
-    # Assegurar que a coluna de data é datetime
-    dff['Data de Abertura do PAJ'] = pd.to_datetime(dff['Data de Abertura do PAJ'], errors='coerce')
-    dff = dff.dropna(subset=['Data de Abertura do PAJ'])
-
-    # Filtrar por data
-    if start_date and end_date:
-        dff = dff[(dff['Data de Abertura do PAJ'] >= pd.to_datetime(start_date)) & (dff['Data de Abertura do PAJ'] <= pd.to_datetime(end_date))]
-
-    # Filtrar por campos categóricos
-    if oficio_selected:
-        dff = dff[dff['Oficio'].isin(oficio_selected)]
-    if pretensao_selected:
-        dff = dff[dff['Tipo de Pretensão'].isin(pretensao_selected)]
-    if materia_selected:
-        dff = dff[dff['Materia'].isin(materia_selected)]
-    if usuario_selected:
-        dff = dff[dff['Usuário'].isin(usuario_selected)]
-
-    if dff.empty:
-        empty_fig = {'data': [], 'layout': {'title': 'Nenhum dado corresponde aos filtros selecionados'}}
-        return empty_fig, empty_fig, empty_fig, empty_fig, empty_fig
-
-    # Gráfico de Séries Temporais (Volume de PAJs por data)
-    paj_counts_by_date = dff.groupby(dff['Data de Abertura do PAJ'].dt.date).size().reset_index(name='count')
-    time_series_fig = px.line(paj_counts_by_date, x='Data de Abertura do PAJ', y='count', title='Volume de PAJs por Data de Abertura',
-                              color_discrete_sequence=[DPU_COLORS["primary_teal"]])
-    time_series_fig.update_layout(xaxis_title="Data de Abertura", yaxis_title="Número de PAJs")
-
-    # Gráficos de Distribuição (Barras ou Roscas)
-    # Ofício
-    oficio_counts = dff['Oficio'].value_counts().reset_index()
-    oficio_counts.columns = ['Oficio', 'count']
-    oficio_counts['percentage'] = (oficio_counts['count'] / oficio_counts['count'].sum()) * 100
-    oficio_fig = px.bar(oficio_counts, x='Oficio', y='count', text_auto=True, title='Distribuição por Ofício',
-                        labels={'count': 'Quantidade'}, color_discrete_sequence=[DPU_COLORS["primary_green"]])
-    oficio_fig.update_traces(texttemplate='%{y} (%{customdata[0]:.1f}%)', customdata=oficio_counts[['percentage']])
-    oficio_fig.update_layout(xaxis_title="Ofício", yaxis_title="Quantidade")
-
-    # Tipo de Pretensão
-    pretensao_counts = dff['Tipo de Pretensão'].value_counts().reset_index()
-    pretensao_counts.columns = ['Tipo de Pretensão', 'count']
-    pretensao_counts['percentage'] = (pretensao_counts['count'] / pretensao_counts['count'].sum()) * 100
-    pretensao_fig = px.bar(pretensao_counts, x='Tipo de Pretensão', y='count', text_auto=True, title='Distribuição por Tipo de Pretensão',
-                           labels={'count': 'Quantidade'}, color_discrete_sequence=[DPU_COLORS["primary_teal"]])
-    pretensao_fig.update_traces(texttemplate='%{y} (%{customdata[0]:.1f}%)', customdata=pretensao_counts[['percentage']])
-    pretensao_fig.update_layout(xaxis_title="Tipo de Pretensão", yaxis_title="Quantidade", xaxis_tickangle=-45)
-
-    # Matéria
-    materia_counts = dff['Materia'].value_counts().reset_index()
-    materia_counts.columns = ['Materia', 'count']
-    materia_counts['percentage'] = (materia_counts['count'] / materia_counts['count'].sum()) * 100
-    materia_fig = px.bar(materia_counts, x='Materia', y='count', text_auto=True, title='Distribuição por Matéria',
-                         labels={'count': 'Quantidade'}, color_discrete_sequence=[DPU_COLORS["primary_green"]])
-    materia_fig.update_traces(texttemplate='%{y} (%{customdata[0]:.1f}%)', customdata=materia_counts[['percentage']])
-    materia_fig.update_layout(xaxis_title="Matéria", yaxis_title="Quantidade", xaxis_tickangle=-45)
-
-    # Usuário
-    usuario_counts = dff['Usuário'].value_counts().reset_index()
-    usuario_counts.columns = ['Usuário', 'count']
-    usuario_counts['percentage'] = (usuario_counts['count'] / usuario_counts['count'].sum()) * 100
-    # Limitar a N usuários para melhor visualização, por exemplo, top 15
-    top_n_usuarios = 15
-    usuario_counts_top = usuario_counts.head(top_n_usuarios)
-    usuario_fig = px.bar(usuario_counts_top, x='Usuário', y='count', text_auto=True, title=f'Distribuição por Usuário (Top {top_n_usuarios})',
-                         labels={'count': 'Quantidade'}, color_discrete_sequence=[DPU_COLORS["primary_teal"]])
-    usuario_fig.update_traces(texttemplate='%{y} (%{customdata[0]:.1f}%)', customdata=usuario_counts_top[['percentage']])
-    usuario_fig.update_layout(xaxis_title="Usuário", yaxis_title="Quantidade", xaxis_tickangle=-45)
-
-    return time_series_fig, oficio_fig, pretensao_fig, materia_fig, usuario_fig
+        return empty_figures('Sem dados para exibir')
+
+    return build_figures(store_data['dataset'], store_data.get('version', 0), start_date, end_date,
+                         as_filter_key(oficio_selected), as_filter_key(pretensao_selected),
+                         as_filter_key(materia_selected), as_filter_key(usuario_selected),
+                         as_search_key(search_query), as_offsets_key(bar_offsets))
+
+# O conteúdo de cada (chave, versão) é imutável, então as figuras podem ser memorizadas por combinação de filtros;
+# `version` só participa da chave do cache (figuras de versões antigas da API deixam de ser usadas)
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def build_figures(dataset_key, version, start_date, end_date, oficio_selected, pretensao_selected, materia_selected, usuario_selected, search, offsets):
+    summary = get_summary(dataset_key)
+    if summary is None or summary['total'] == 0:
+        return empty_figures('Sem dados para exibir')
+
+    counts = build_counts(dataset_key, version, start_date, end_date, oficio_selected, pretensao_selected, materia_selected, usuario_selected, search)
+    return figures_from_counts(counts if counts and counts['total'] else None, dict(offsets))
+
+# Trocar a página de um gráfico de barras reaproveita as contagens já filtradas
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def build_counts(dataset_key, version, start_date, end_date, oficio_selected, pretensao_selected, materia_selected, usuario_selected, search):
+    summary = get_summary(dataset_key)
+
+    # Sem filtros efetivos, as contagens são os agregados já calculados do conjunto
+    if not (oficio_selected or pretensao_selected or materia_selected or usuario_selected or search):
+        covers_all_dates = not (start_date and end_date) or (
+            pd.to_datetime(start_date).date() <= summary['days'].index.min()
+            and pd.to_datetime(end_date).date() >= summary['days'].index.max()
+        )
+        if covers_all_dates:
+            return summary
+
+    selections = {
+        'Oficio': oficio_selected,
+        'Tipo de Pretensão': pretensao_selected,
+        'Materia': materia_selected,
+        'Usuário': usuario_selected,
+    }
+    if QUERY_ENGINE == 'duckdb' and not search:
+        # Filtragem e agregação em SQL sobre o arquivo DuckDB do conjunto (a busca textual usa o índice em memória)
+        return duckdb_engine.filtered_counts(dataset_key, start_date, end_date, selections)
+
+    # Filtrar por data e por campos categóricos (a coluna de data já é datetime, normalizada no registro)
+    dff = get_dataset(dataset_key)
+    mask = filter_mask(dff, start_date, end_date, selections)
+    if search:
+        mask = mask & search_mask(dataset_key, search, dff)
+    dff = dff[mask]
+
+    return compute_counts(dff) if not dff.empty else None
+
+# Clique numa barra "Outros" avança a página daquele gráfico; em "Anteriores", volta uma página
+@app.callback(
+    Output('bar-offsets', 'data'),
+    *[Input(graph_id, 'clickData') for graph_id in BAR_GRAPHS],
+    Input('intermediate-data-store', 'data'),
+    State('bar-offsets', 'data'),
+    prevent_initial_call=True
+)
+def update_bar_offsets(*args):
+    offsets = dict(args[-1] or {})
+    trigger_id = dash.callback_context.triggered_id
+    if trigger_id not in BAR_GRAPHS:
+        return {} # Outro conjunto de dados: todos os gráficos voltam à primeira página
+    click_data = args[list(BAR_GRAPHS).index(trigger_id)]
+    if not click_data or not click_data.get('points'):
+        return dash.no_update
+    customdata = click_data['points'][0].get('customdata') or []
+    action = int(customdata[1]) if len(customdata) > 1 else 0
+    if action not in (PAGE_PREVIOUS, PAGE_NEXT):
+        return dash.no_update # Clique numa categoria comum
+    column = BAR_GRAPHS[trigger_id]
+    offsets[column] = max(offsets.get(column, 0) + action * BAR_LIMITS[column], 0)
+    return offsets
+
+# Registra a versão do callback de gráficos de acordo com o modo de filtragem
+if CLIENTSIDE_FILTERING:
+    # O texto da busca não vai ao navegador: o servidor consulta o índice e envia a máscara de linhas
+    @lru_cache(maxsize=FIGURE_CACHE_SIZE)
+    def build_search_mask(dataset_key, version, search):
+        """Linhas do payload colunar (as de data válida, na mesma ordem) encontradas pela busca, em bits empacotados."""
+        df = get_dataset(dataset_key)
+        mask = search_mask(dataset_key, search, df)[df['Data de Abertura do PAJ'].notna().to_numpy()]
+        return {
+            'dataset': dataset_key,
+            'version': version,
+            'length': int(len(mask)),
+            'bits': base64.b64encode(np.packbits(mask, bitorder='little').tobytes()).decode('ascii'),
+        }
+
+    # O payload só é enviado ao navegador quando o conjunto (ou sua versão) muda; os callbacks do servidor
+    # recebem apenas o Store pequeno
+    @app.callback(
+        Output('columnar-data-store', 'data'),
+        Input('intermediate-data-store', 'data')
+    )
+    def update_columnar_payload(store_data):
+        store_data = checked_store(store_data)
+        if not store_data:
+            return None
+        return build_columnar_payload(store_data['dataset'], store_data.get('version', 0))
+
+    @app.callback(
+        Output('search-mask-store', 'data'),
+        Input('text-search', 'value'),
+        Input('intermediate-data-store', 'data')
+    )
+    def update_search_mask(search_query, store_data):
+        search = as_search_key(search_query)
+        store_data = checked_store(store_data)
+        if not store_data or not search:
+            return None
+        return build_search_mask(store_data['dataset'], store_data.get('version', 0), search)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='sisdpu', function_name='update_graphs'),
+        *GRAPH_OUTPUTS,
+        Input('columnar-data-store', 'data'),
+        *GRAPH_INPUTS[1:-1],
+        Input('search-mask-store', 'data'),
+        BAR_OFFSETS_INPUT
+    )
+else:
+    app.callback(*GRAPH_OUTPUTS, *GRAPH_INPUTS, BAR_OFFSETS_INPUT)(update_graphs)
+
+# Link de exportação: só monta a URL a partir do estado dos filtros, então roda no navegador
+app.clientside_callback(
+    ClientsideFunction(namespace='sisdpu', function_name='export_href'),
+    Output('export-link', 'href'),
+    Input('intermediate-data-store', 'data'),
+    Input('export-format', 'value'),
+    *GRAPH_INPUTS[1:],
+    State('export-base-url', 'data')
+)
 
+# Rota de exportação em streaming (mesmos filtros de update_graphs, via query string)
+@app.server.route('/export')
+def export_filtered_data():
+    args = flask.request.args
+    export_format = args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return "Formato de exportação não suportado", 400
+    dataset_key = args.get('dataset', LOCAL_EXCEL_KEY)
+    if not is_dataset_key(dataset_key):
+        return "Conjunto de dados inválido", 400
+    df = get_dataset(dataset_key)
+    if df is None:
+        return "Conjunto de dados não encontrado", 404
+    selections = {column: args.getlist(param) for param, column in FILTER_COLUMNS.items()}
+    mask = filter_mask(df, args.get('start'), args.get('end'), selections)
+    if search_terms(args.get('q')):
+        mask = mask & search_mask(dataset_key, args.get('q'), df)
+    return export_response(df, mask, export_format)
+
+def warm_up():
+    """Pré-renderiza o conteúdo exibido na carga inicial (planilha local sem filtros)."""
+    df = load_local_excel_data()
+    if df.empty or 'Data de Abertura do PAJ' not in df.columns:
+        return
+    dates = df['Data de Abertura do PAJ'].dropna()
+    if dates.empty:
+        return
+    if CLIENTSIDE_FILTERING:
+        build_columnar_payload(LOCAL_EXCEL_KEY, 0) # Payload colunar codificado uma vez, antes do fork
+    # Grava as partições por Unidade, para que a primeira visão de uma Unidade em cada worker leia só a sua
+    partition_units(LOCAL_EXCEL_KEY, df)
+    get_index(LOCAL_EXCEL_KEY, df) # Índice da busca textual, compartilhado com os workers
+    if QUERY_ENGINE == 'duckdb':
+        # Apenas grava o arquivo; as conexões são abertas depois do fork, em cada worker
+        duckdb_engine.build_database(LOCAL_EXCEL_KEY)
+    if not CLIENTSIDE_FILTERING:
+        # Mesmos valores que update_filters define como padrão no DatePickerRange
+        start_date = dates.min().date().isoformat()
+        end_date = dates.max().date().isoformat()
+        build_figures(LOCAL_EXCEL_KEY, 0, start_date, end_date, (), (), (), (), '', ())
+
+# Com gunicorn --preload este bloco roda no mestre, antes do fork dos workers
+if PRELOAD_DATA:
+    preload_default_dataset()
+    warm_up()
+    freeze_shared_memory()
 
+if __name__ == '__main__':
+    app.run(debug=True, host='0.0.0.0')
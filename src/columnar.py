@@ -0,0 +1,84 @@
+# src/columnar.py
+"""Representação colunar compacta dos dados para filtragem no navegador.
+
+Apenas a coluna de data e as colunas usadas nos filtros/gráficos são enviadas.
+Cada coluna categórica é codificada por dicionário (lista de categorias +
+códigos inteiros) e a data vira um deslocamento em dias desde 1970-01-01.
+Os arrays são serializados em base64 (little-endian) para serem lidos no
+navegador diretamente como typed arrays (Uint8Array, Uint16Array, Int32Array).
+Valores ausentes recebem o código len(categories) (sem categoria correspondente),
+que o navegador não conta, como observed_value_counts no servidor.
+"""
+import base64
+import numpy as np
+import pandas as pd
+
+DATE_COLUMN = 'Data de Abertura do PAJ'
+
+# Chave curta usada no payload -> nome da coluna no DataFrame
+FILTER_COLUMNS = {
+    'oficio': 'Oficio',
+    'pretensao': 'Tipo de Pretensão',
+    'materia': 'Materia',
+    'usuario': 'Usuário',
+}
+
+
+def _encode_array(values):
+    return base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii')
+
+
+def _decode_array(encoded, dtype):
+    return np.frombuffer(base64.b64decode(encoded), dtype=dtype)
+
+
+def _codes_dtype(n_categories):
+    # Menor tipo inteiro sem sinal que comporta todos os códigos
+    if n_categories <= np.iinfo(np.uint8).max:
+        return np.dtype('<u1')
+    if n_categories <= np.iinfo(np.uint16).max:
+        return np.dtype('<u2')
+    return np.dtype('<u4')
+
+
+def encode_columnar(df):
+    """Converte o DataFrame no payload colunar. Retorna None se faltarem colunas."""
+    if df.empty or DATE_COLUMN not in df.columns or any(c not in df.columns for c in FILTER_COLUMNS.values()):
+        return None
+
+    dates = pd.to_datetime(df[DATE_COLUMN], errors='coerce')
+    df = df[dates.notna()]
+    dates = dates[dates.notna()]
+    days = dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype('<i4')
+
+    columns = {}
+    for key, column in FILTER_COLUMNS.items():
+        values = df[column]
+        # Texto apenas nos valores presentes: astype(str) sozinho transformaria NaN na categoria 'nan'
+        codes, categories = pd.factorize(values.astype(str).where(values.notna()), sort=True)
+        codes[codes < 0] = len(categories)
+        dtype = _codes_dtype(len(categories) + 1)
+        columns[key] = {
+            'name': column,
+            'categories': [str(c) for c in categories],
+            'dtype': dtype.str,
+            'codes': _encode_array(codes.astype(dtype)),
+        }
+
+    return {
+        'format': 'columnar',
+        'length': int(len(df)),
+        'days': _encode_array(days),
+        'columns': columns,
+    }
+
+
+def decode_columnar(payload):
+    """Reconstrói um DataFrame (data + colunas categóricas) a partir do payload."""
+    days = _decode_array(payload['days'], '<i4')
+    data = {DATE_COLUMN: pd.to_datetime(days.astype('datetime64[D]'))}
+    for spec in payload['columns'].values():
+        codes = _decode_array(spec['codes'], spec['dtype']).astype(np.int64)
+        codes[codes == len(spec['categories'])] = -1 # Valor ausente
+        data[spec['name']] = pd.Categorical.from_codes(codes, categories=spec['categories'])
+    return pd.DataFrame(data)
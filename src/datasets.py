@@ -0,0 +1,580 @@
+# src/datasets.py
+"""Registro dos conjuntos de dados usados pelo dashboard.
+
+Os callbacks não trafegam mais o DataFrame inteiro pelo dcc.Store: o Store guarda
+apenas a chave do conjunto de dados e o DataFrame fica no servidor.
+
+* O conjunto padrão (planilha local) pode ser carregado no processo mestre do
+  gunicorn (`--preload`) antes do fork. As colunas de texto são convertidas em
+  categorias (códigos numpy + dicionário) e as datas em datetime64, de modo que os
+  workers compartilhem as páginas de memória via copy-on-write em vez de cada um
+  manter milhares de objetos Python (cujo refcount forçaria a cópia das páginas).
+* Conjuntos enviados por upload são gravados em disco (DATASET_CACHE_DIR) para
+  que qualquer worker consiga recuperá-los, com um cache LRU em memória na frente.
+* Conjuntos lidos de uma fonte externa (planilha local, API) são registrados com
+  register_source: cada processo os carrega sob demanda e eles nunca vão para o
+  disco, pois o conteúdo sob a mesma chave muda junto com a fonte (ver `version`).
+* Cada conjunto pode ser dividido por Unidade (chave "<conjunto>~<hash da unidade>").
+  Na primeira vez que uma Unidade é pedida, o conjunto inteiro é particionado em
+  arquivos por Unidade; depois disso qualquer worker carrega só a partição pedida,
+  que disputa o mesmo cache LRU e é descartada quando fica fria. As partições de
+  fontes externas levam a versão da fonte no nome do arquivo.
+
+As chaves chegam do navegador (dcc.Store, query string de /export) e viram nomes de
+arquivo lidos com pickle: get_dataset só aceita chaves no formato gerado pelo próprio
+servidor (is_dataset_key), e _cache_path recusa nomes com separadores de diretório.
+"""
+import gc
+import os
+import re
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+DATE_COLUMN = 'Data de Abertura do PAJ'
+KEY_COLUMN = 'PAJ'
+UNIT_COLUMN = 'Unidade'
+LOCAL_EXCEL_KEY = 'local_excel'
+UNIT_SEPARATOR = '~'
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_FILE_PATH = os.path.join(project_root, "data", "tratado_filtrado.xlsx")
+
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", os.path.join(tempfile.gettempdir(), "sisdpu_datasets"))
+DATASET_CACHE_SIZE = int(os.getenv("DATASET_CACHE_SIZE", "8"))
+# Mesclagens sobre uploads/mesclagens são gravadas só com a diferença; a cada MERGE_CHAIN_LIMIT
+# mesclagens encadeadas o conjunto é gravado inteiro, para limitar o custo de remontá-lo
+MERGE_CHAIN_LIMIT = int(os.getenv("MERGE_CHAIN_LIMIT", "4"))
+# Espaço máximo do diretório de cache; acima dele os uploads/mesclagens usados há mais tempo são removidos (0 = sem limite)
+DATASET_CACHE_MAX_MB = int(os.getenv("DATASET_CACHE_MAX_MB", "1024"))
+
+# Conjuntos carregados antes do fork (somente leitura, compartilhados pelos workers)
+_preloaded = {}
+# Cache LRU por processo dos conjuntos lidos do disco
+_cache = OrderedDict()
+_lock = threading.Lock()
+# Fontes externas: chave -> (função que carrega o DataFrame, função que retorna a versão atual)
+_sources = {}
+# PAJs de cada conjunto (nome versionado) e profundidade da cadeia de mesclagens, LRU por processo
+_paj_indexes = OrderedDict()
+# Diretórios com arquivos nomeados por versioned_name (este e, por exemplo, o do DuckDB), limpos em conjunto
+_cache_dirs = [DATASET_CACHE_DIR]
+
+# Chaves de uploads/mesclagens (content_key) e sufixo das partições por Unidade (unit_key)
+_CONTENT_KEY_PATTERN = re.compile(r'(upload|merged)-[0-9a-f]{16}')
+_UNIT_HASH_PATTERN = re.compile(r'[0-9a-f]{12}')
+# Nomes de arquivo no diretório de cache: sem '/' nem '..'
+_CACHE_NAME_PATTERN = re.compile(r'[A-Za-z0-9_][A-Za-z0-9_.~-]*')
+
+
+def compact_frame(df):
+    """Normaliza a data e converte colunas de texto em categorias (buffers numpy)."""
+    df = df.copy()
+    if DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], errors='coerce', dayfirst=True)
+    for column in df.columns:
+        if column != DATE_COLUMN and (pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(df[column])):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def read_local_excel():
+    df = pd.read_excel(DATA_FILE_PATH)
+    return compact_frame(df)
+
+
+def local_excel_version():
+    # A planilha local pode mudar entre deploys: a versão acompanha data de modificação e tamanho
+    stat = os.stat(DATA_FILE_PATH)
+    return hashlib.sha1(f'{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest()[:12]
+
+
+def register_source(key, load, version):
+    """Registra uma fonte externa: `load()` retorna o DataFrame e `version()` a versão carregada."""
+    _sources[key] = (load, version)
+
+
+def base_key_of(key):
+    """Chave do conjunto completo (a própria chave, se não for uma partição por Unidade)."""
+    return key.split(UNIT_SEPARATOR, 1)[0]
+
+
+def unit_key(base_key, unit):
+    """Chave da partição de `base_key` com os PAJs da Unidade informada."""
+    return f"{base_key}{UNIT_SEPARATOR}{hashlib.sha1(str(unit).encode('utf-8')).hexdigest()[:12]}"
+
+
+def is_dataset_key(key):
+    """Indica se `key` tem o formato de uma chave gerada pelo servidor (fonte registrada, upload ou mesclagem, com ou sem Unidade)."""
+    if not isinstance(key, str):
+        return False
+    base_key, separator, unit_hash = key.partition(UNIT_SEPARATOR)
+    if separator and not _UNIT_HASH_PATTERN.fullmatch(unit_hash):
+        return False
+    return base_key in _sources or _CONTENT_KEY_PATTERN.fullmatch(base_key) is not None
+
+
+def is_source(key):
+    return base_key_of(key) in _sources
+
+
+def dataset_version(key):
+    """Versão atual do conteúdo de uma fonte externa ou de suas partições (None para chaves imutáveis)."""
+    base_key = base_key_of(key)
+    if base_key not in _sources:
+        return None
+    return _sources[base_key][1]()
+
+
+def invalidate_dataset(key):
+    """Descarta a cópia em memória do conjunto `key` e de suas partições neste processo."""
+    _preloaded.pop(key, None)
+    with _lock:
+        for cached_key in [k for k in _cache if base_key_of(k) == key]:
+            del _cache[cached_key]
+
+
+def preload_default_dataset():
+    """Carrega a planilha local no processo atual (mestre, com gunicorn --preload)."""
+    try:
+        _preloaded[LOCAL_EXCEL_KEY] = read_local_excel()
+        print(f"Conjunto de dados padrão pré-carregado ({len(_preloaded[LOCAL_EXCEL_KEY])} registros).")
+    except Exception as e:
+        print(f"Erro ao pré-carregar planilha local: {e}")
+
+
+def freeze_shared_memory():
+    """Move os objetos já alocados para a geração permanente do GC.
+
+    Evita que as coletas nos workers percorram (e portanto escrevam em) os objetos
+    herdados do mestre, o que desfaria o compartilhamento copy-on-write.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def _cache_path(name):
+    if not _CACHE_NAME_PATTERN.fullmatch(name) or '..' in name:
+        raise ValueError(f"Nome inválido no cache de conjuntos: {name!r}")
+    return os.path.join(DATASET_CACHE_DIR, f"{name}.pkl")
+
+
+def save_to_disk(name, obj):
+    """Grava um objeto no diretório compartilhado entre os workers (escrita atômica)."""
+    try:
+        os.makedirs(DATASET_CACHE_DIR, exist_ok=True)
+        tmp_path = _cache_path(name) + f".{os.getpid()}.tmp"
+        pd.to_pickle(obj, tmp_path)
+        os.replace(tmp_path, _cache_path(name))
+    except Exception as e:
+        print(f"Erro ao persistir {name}: {e}")
+
+
+def load_from_disk(name):
+    """Lê um objeto gravado por save_to_disk (None se não existir)."""
+    path = _cache_path(name)
+    try:
+        obj = pd.read_pickle(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Erro ao ler {name}: {e}")
+        return None
+    try:
+        os.utime(path) # Data de modificação = último uso, para a limpeza de enforce_cache_limit
+    except OSError:
+        pass
+    return obj
+
+
+def register_cache_dir(path):
+    """Inclui um diretório com arquivos nomeados por versioned_name na limpeza do cache em disco."""
+    if path not in _cache_dirs:
+        _cache_dirs.append(path)
+
+
+def _cache_files():
+    for directory in _cache_dirs:
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            continue
+        for name in names:
+            path = os.path.join(directory, name)
+            if not name.endswith('.tmp') and os.path.isfile(path):
+                yield name, path
+
+
+def _file_key(name):
+    # Chave (versionada) a que o arquivo pertence: o nome até o primeiro '.' ou '~'
+    return re.split(r'[.~]', name, maxsplit=1)[0]
+
+
+def _remove_file(path):
+    try:
+        os.remove(path) # Workers com o arquivo aberto continuam lendo até fechá-lo
+    except OSError:
+        pass
+
+
+def _superseded(version, current):
+    # Versões numéricas (API) só são removidas se forem mais antigas: outro worker pode já conhecer uma mais nova
+    if version.isdigit() and current.isdigit():
+        return int(version) < int(current)
+    return version != current
+
+
+def prune_versions(key):
+    """Remove do disco os arquivos de versões anteriores da fonte externa `key` (partições, agregados, DuckDB)."""
+    current = dataset_version(key)
+    if current is None:
+        return
+    prefix = f"{key}-"
+    for name, path in _cache_files():
+        file_key = _file_key(name)
+        if file_key.startswith(prefix) and _superseded(file_key[len(prefix):], str(current)):
+            _remove_file(path)
+
+
+def enforce_cache_limit(keep=()):
+    """Remove os uploads/mesclagens usados há mais tempo enquanto o cache em disco passar de DATASET_CACHE_MAX_MB.
+
+    Uma mesclagem gravada como diferença depende do conjunto de origem: a origem conta
+    como usada sempre que a mesclagem é usada, nunca é removida antes dela e, se for
+    removida, leva junto as mesclagens que dependem dela. As chaves em `keep` (e suas
+    origens) nunca são removidas.
+    """
+    if DATASET_CACHE_MAX_MB <= 0:
+        return
+    total, groups = 0, {}
+    for name, path in _cache_files():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        total += stat.st_size
+        key = _file_key(name)
+        if _CONTENT_KEY_PATTERN.fullmatch(key):
+            group = groups.setdefault(key, {'used': 0, 'files': []})
+            group['used'] = max(group['used'], stat.st_mtime)
+            group['files'].append((path, stat.st_size))
+    limit = DATASET_CACHE_MAX_MB * 1024 * 1024
+    if total <= limit:
+        return
+
+    parents = {}
+    for key in groups:
+        info = load_from_disk(f"{key}.pajs")
+        if info and info.get('base') in groups:
+            parents[key] = info['base']
+    protected = set()
+    for key in groups:
+        parent = parents.get(key)
+        while parent is not None:
+            groups[parent]['used'] = max(groups[parent]['used'], groups[key]['used'])
+            parent = parents.get(parent)
+    for key in keep:
+        while key is not None and key not in protected:
+            protected.add(key)
+            key = parents.get(key)
+
+    removed = set()
+    for key in sorted(groups, key=lambda k: groups[k]['used']):
+        if total <= limit:
+            break
+        if key in protected or key in removed:
+            continue
+        # Remove também as mesclagens que dependem desta chave (não poderiam mais ser remontadas)
+        doomed = [k for k in groups if k not in removed and k not in protected and _depends_on(k, key, parents)]
+        for doomed_key in doomed:
+            for path, size in groups[doomed_key]['files']:
+                _remove_file(path)
+                total -= size
+            removed.add(doomed_key)
+        print(f"Cache em disco acima de {DATASET_CACHE_MAX_MB} MB: removidos {', '.join(doomed)}.")
+
+
+def _depends_on(key, ancestor, parents):
+    while key is not None:
+        if key == ancestor:
+            return True
+        key = parents.get(key)
+    return False
+
+
+def _remember(key, df):
+    with _lock:
+        _cache[key] = df
+        _cache.move_to_end(key)
+        while len(_cache) > DATASET_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def content_key(prefix, content):
+    """Chave estável (e imutável) derivada do conteúdo enviado."""
+    digest = hashlib.sha1(content.encode('utf-8') if isinstance(content, str) else content).hexdigest()[:16]
+    return f"{prefix}-{digest}"
+
+
+def register_dataset(key, df):
+    """Registra um DataFrame sob a chave informada e o persiste para os demais workers."""
+    df = compact_frame(df)
+    save_to_disk(key, df)
+    _remember(key, df)
+    enforce_cache_limit(keep=(key,))
+    return key
+
+
+def get_dataset(key, remember=True):
+    """Retorna o DataFrame registrado sob a chave (ou None se não existir).
+
+    O DataFrame retornado é compartilhado: os callbacks não devem alterá-lo no lugar.
+    Chaves fora do formato de is_dataset_key são recusadas (None) antes de qualquer acesso ao disco.
+    Com remember=False, um conjunto que não esteja em memória é carregado sem entrar no
+    cache LRU (para um uso pontual, como particionar ou calcular agregados).
+    """
+    if not is_dataset_key(key):
+        return None
+    df = _cached(key)
+    if df is None:
+        df = _load(key)
+        if df is not None and remember:
+            _remember(key, df)
+    return df
+
+
+def _cached(key):
+    if key in _preloaded:
+        return _preloaded[key]
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    return None
+
+
+def _load(key):
+    """Carrega o conjunto da partição, da fonte externa ou do disco, sem guardá-lo no cache."""
+    if UNIT_SEPARATOR in key:
+        return _load_unit_partition(key)
+    if key in _sources:
+        try:
+            df = _sources[key][0]()
+        except Exception as e:
+            print(f"Erro ao carregar o conjunto {key}: {e}")
+            return None
+        prune_versions(key) # Arquivos gravados para versões anteriores da fonte não serão mais lidos
+        return df
+    df = load_from_disk(key)
+    if isinstance(df, dict): # Mesclagem gravada como diferença em relação ao conjunto de origem (ver append_dataset)
+        return _load_merge(df)
+    return df
+
+
+def versioned_name(key):
+    """Nome de arquivo para o conteúdo de `key`: inclui a versão da fonte externa, se houver."""
+    base_key = base_key_of(key)
+    version = dataset_version(base_key)
+    prefix = f"{base_key}-{version}" if version is not None else base_key
+    return prefix + key[len(base_key):]
+
+
+def partition_units(base_key, df=None):
+    """Grava em disco uma partição por Unidade do conjunto `base_key`, se ainda não existirem.
+
+    Se o conjunto completo não estiver em memória, ele é carregado só para a divisão e
+    descartado em seguida (não entra no cache LRU ao lado das partições).
+    """
+    df = get_dataset(base_key, remember=False) if df is None else df
+    if df is None or UNIT_COLUMN not in df.columns:
+        return
+    # Calculado depois de carregar o conjunto: para fontes externas, a versão é a do conteúdo carregado
+    marker = f"{versioned_name(base_key)}.units"
+    if load_from_disk(marker) is not None:
+        return
+    keys = []
+    for unit, part in df.groupby(UNIT_COLUMN, observed=True, sort=False):
+        part = part.reset_index(drop=True)
+        for column in part.columns:
+            if isinstance(part[column].dtype, pd.CategoricalDtype):
+                part[column] = part[column].cat.remove_unused_categories()
+        key = unit_key(base_key, unit)
+        save_to_disk(versioned_name(key), part)
+        keys.append(key)
+    # Gravado por último: indica que todas as partições do conjunto já estão no disco
+    save_to_disk(marker, keys)
+
+
+def _load_unit_partition(key):
+    df = load_from_disk(versioned_name(key))
+    if df is None and load_from_disk(f"{versioned_name(base_key_of(key))}.units") is None:
+        # Primeira Unidade pedida deste conjunto: particiona o conjunto completo uma única vez
+        partition_units(base_key_of(key))
+        df = load_from_disk(versioned_name(key))
+    return df
+
+
+def filter_mask(df, start_date, end_date, selections):
+    """Máscara booleana (numpy) das linhas com data válida dentro do intervalo e nos valores selecionados.
+
+    `selections` mapeia o nome da coluna para os valores selecionados (vazio = sem filtro).
+    """
+    dates = df[DATE_COLUMN]
+    mask = dates.notna().to_numpy()
+    if start_date and end_date:
+        mask = mask & ((dates >= pd.to_datetime(start_date)) & (dates <= pd.to_datetime(end_date))).to_numpy()
+    for column, selected in selections.items():
+        if selected:
+            mask = mask & df[column].isin(selected).to_numpy()
+    return mask
+
+
+def _row_hashes(df, columns):
+    # Hash por linha das colunas em comum, com as datas já normalizadas
+    return pd.util.hash_pandas_object(df[columns].astype(str), index=False)
+
+
+def _observed_keys(series):
+    """Números de PAJ presentes na coluna, como texto (em colunas categóricas, convertendo só as categorias)."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        return pd.Index(series.cat.categories.astype(str)[np.unique(codes[codes >= 0])])
+    return pd.Index(series.dropna().astype(str).unique())
+
+
+def _key_mask(series, keys):
+    """Máscara booleana (numpy) das linhas cujo número de PAJ está em `keys`."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        selected = np.flatnonzero(series.cat.categories.astype(str).isin(keys))
+        return np.isin(series.cat.codes.to_numpy(), selected)
+    return series.astype(str).isin(keys).to_numpy()
+
+
+def _remember_paj_index(name, info):
+    with _lock:
+        _paj_indexes[name] = info
+        _paj_indexes.move_to_end(name)
+        while len(_paj_indexes) > DATASET_CACHE_SIZE:
+            _paj_indexes.popitem(last=False)
+
+
+def paj_index(key, df=None):
+    """PAJs do conjunto `key` ({'pajs': Index, 'depth': profundidade da cadeia de mesclagens}).
+
+    Montado uma vez por conjunto e gravado ao lado dele; numa mesclagem é derivado do
+    índice do conjunto de origem. None se o conjunto não existir ou não tiver a coluna PAJ.
+    """
+    name = versioned_name(key)
+    with _lock:
+        if name in _paj_indexes:
+            _paj_indexes.move_to_end(name)
+            return _paj_indexes[name]
+    info = load_from_disk(f"{name}.pajs")
+    if info is None:
+        df = get_dataset(key, remember=False) if df is None else df
+        if df is None or KEY_COLUMN not in df.columns:
+            return None
+        info = {'pajs': _observed_keys(df[KEY_COLUMN]), 'depth': 0}
+        save_to_disk(f"{name}.pajs", info)
+    _remember_paj_index(name, info)
+    return info
+
+
+def _empty_column(template, length):
+    # Coluna ausente de um dos lados: valores faltantes com o tipo da coluna do outro lado
+    return template.iloc[0:0].reindex(pd.RangeIndex(length))
+
+
+def _concat_column(old, new):
+    if isinstance(old.dtype, pd.CategoricalDtype) and isinstance(new.dtype, pd.CategoricalDtype):
+        try:
+            # As categorias de `old` ficam na frente, com os mesmos códigos; as novas entram no fim
+            return pd.Series(union_categoricals([old, new], ignore_order=True), name=old.name)
+        except TypeError:
+            pass # Categorias de tipos diferentes (ex.: números e textos)
+    combined = pd.concat([old, new], ignore_index=True)
+    if pd.api.types.is_object_dtype(combined):
+        combined = combined.astype('category')
+    return combined
+
+
+def _merge_frames(base, drop, added):
+    """Linhas de `base` fora da máscara `drop` seguidas de `added`, sem recompactar o conjunto inteiro."""
+    kept = base[~drop] if drop.any() else base
+    columns = {}
+    for column in list(base.columns) + [c for c in added.columns if c not in base.columns]:
+        old = kept[column] if column in kept.columns else _empty_column(added[column], len(kept))
+        new = added[column] if column in added.columns else _empty_column(base[column], len(added))
+        columns[column] = _concat_column(old.reset_index(drop=True), new.reset_index(drop=True))
+    return pd.DataFrame(columns)
+
+
+def _load_merge(record):
+    base = get_dataset(record['base'], remember=False)
+    if base is None:
+        return None
+    return _merge_frames(base, _key_mask(base[KEY_COLUMN], record['removed']), record['added'])
+
+
+def append_dataset(base_key, key, upload_df):
+    """Mescla uma planilha enviada ao conjunto `base_key`, deduplicando pelo número do PAJ.
+
+    Um PAJ pode ter várias linhas, então cada PAJ é tratado como um grupo: PAJs novos
+    são acrescentados e PAJs já existentes só são substituídos se alguma linha mudou.
+    A consulta aos PAJs existentes usa o índice guardado com o conjunto (paj_index) e a
+    comparação linha a linha se limita aos PAJs da planilha enviada. O conjunto
+    mesclado mantém as categorias do original (só as novas são acrescentadas) e, sobre
+    uploads/mesclagens, é gravado apenas como a diferença (ver MERGE_CHAIN_LIMIT).
+    Retorna (chave, linhas removidas, linhas acrescentadas) para que os agregados
+    possam ser atualizados apenas com a diferença.
+    """
+    base = get_dataset(base_key)
+    upload_df = compact_frame(upload_df)
+    base_info = paj_index(base_key, base) if base is not None else None
+    if base is None or base.empty or base_info is None or KEY_COLUMN not in upload_df.columns:
+        return register_dataset(key, upload_df), upload_df.iloc[0:0], upload_df
+
+    upload_keys = upload_df[KEY_COLUMN].astype(str)
+    in_base = base_info['pajs'].get_indexer(upload_keys) >= 0
+
+    # Compara apenas os grupos de PAJs presentes nas duas planilhas
+    common_columns = [c for c in upload_df.columns if c in base.columns]
+    candidates = base[_key_mask(base[KEY_COLUMN], upload_keys[in_base])]
+    candidate_keys = candidates[KEY_COLUMN].astype(str)
+    old_groups = _row_hashes(candidates, common_columns).groupby(candidate_keys.values).agg(lambda h: tuple(sorted(h)))
+    matching = upload_df[in_base]
+    new_groups = _row_hashes(matching, common_columns).groupby(upload_keys[in_base].values).agg(lambda h: tuple(sorted(h)))
+    changed_keys = new_groups.index[new_groups != old_groups.reindex(new_groups.index)]
+
+    added = upload_df[~in_base | upload_keys.isin(changed_keys).to_numpy()]
+    removed = candidates[candidate_keys.isin(changed_keys).to_numpy()]
+    if added.empty:
+        return base_key, removed, added
+
+    merged = _merge_frames(base, _key_mask(base[KEY_COLUMN], changed_keys), added)
+    new_keys = _observed_keys(added[KEY_COLUMN])
+    info = {
+        'pajs': base_info['pajs'].append(new_keys[base_info['pajs'].get_indexer(new_keys) < 0]),
+        # Fontes externas mudam sob a mesma chave: a mesclagem sobre elas é gravada inteira
+        'depth': 0 if is_source(base_key) else base_info['depth'] + 1,
+    }
+    if 0 < info['depth'] < MERGE_CHAIN_LIMIT:
+        info['base'] = base_key # Dependência usada por enforce_cache_limit
+        save_to_disk(key, {'base': base_key, 'removed': list(changed_keys), 'added': added})
+    else:
+        info['depth'] = 0
+        save_to_disk(key, merged)
+    save_to_disk(f"{key}.pajs", info)
+    _remember_paj_index(key, info)
+    _remember(key, merged)
+    enforce_cache_limit(keep=(key,))
+    print(f"Mesclagem em {base_key}: {len(added)} linhas novas/alteradas, {len(removed)} substituídas.")
+    return key, removed, added
+
+
+register_source(LOCAL_EXCEL_KEY, read_local_excel, local_excel_version)
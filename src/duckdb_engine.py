@@ -0,0 +1,143 @@
+# src/duckdb_engine.py
+"""Motor de consulta opcional baseado em DuckDB embarcado (QUERY_ENGINE=duckdb).
+
+Cada conjunto de dados registrado (planilha local, API ou upload) é gravado uma única
+vez num arquivo DuckDB próprio (fontes externas: um arquivo por versão). Como o
+conteúdo de cada arquivo é imutável, ele nunca é reescrito e todos os workers o
+abrem em modo somente leitura (o DuckDB não permite vários processos escrevendo no
+mesmo arquivo). As agregações filtradas dos
+gráficos viram uma única consulta SQL vetorizada com GROUPING SETS, executada em
+múltiplas threads e com spill para disco quando excede DUCKDB_MEMORY_LIMIT.
+"""
+import os
+import threading
+
+import duckdb
+import pandas as pd
+
+from src.datasets import DATE_COLUMN, DATASET_CACHE_DIR, get_dataset, versioned_name, register_cache_dir
+from src.aggregates import CATEGORY_COLUMNS, SUMMARY_COLUMNS
+
+DUCKDB_DIR = os.getenv("DUCKDB_DIR", os.path.join(DATASET_CACHE_DIR, "duckdb"))
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "512MB")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", str(os.cpu_count() or 1)))
+# Arquivos de versões anteriores e de uploads removidos do cache são apagados junto com os demais
+register_cache_dir(DUCKDB_DIR)
+
+TABLE_NAME = 'paj_data'
+
+# Conexões somente leitura abertas por este processo: chave -> (arquivo, conexão)
+_connections = {}
+_lock = threading.Lock()
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _database_path(key):
+    # Fontes externas (planilha local, API) mudam sob a mesma chave: um arquivo por versão.
+    # A versão vem de dataset_version (via versioned_name), sem carregar o conjunto
+    return os.path.join(DUCKDB_DIR, f"{versioned_name(key)}.duckdb")
+
+
+def _config(read_only):
+    return {
+        'access_mode': 'READ_ONLY' if read_only else 'READ_WRITE',
+        'memory_limit': DUCKDB_MEMORY_LIMIT,
+        'threads': DUCKDB_THREADS,
+        'temp_directory': os.path.join(DUCKDB_DIR, 'tmp'),
+    }
+
+
+def build_database(key):
+    """Grava o conjunto `key` no seu arquivo DuckDB, se ainda não existir. Retorna o caminho."""
+    path = _database_path(key)
+    if os.path.exists(path):
+        return path
+    df = get_dataset(key, remember=False) # Só para gravar o arquivo: o DataFrame não fica no cache
+    if df is None:
+        return None
+    # Fontes externas: o conteúdo carregado pode ser de uma versão mais nova que a consultada acima
+    path = _database_path(key)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.join(DUCKDB_DIR, 'tmp'), exist_ok=True)
+    # Escreve num arquivo temporário e renomeia, para que outro worker nunca abra um arquivo incompleto
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    con = duckdb.connect(tmp_path, config=_config(read_only=False))
+    try:
+        con.register('source_df', df)
+        con.execute(f"CREATE TABLE {TABLE_NAME} AS SELECT * FROM source_df")
+        con.unregister('source_df')
+    finally:
+        con.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+def _connection(key):
+    path = _database_path(key)
+    with _lock:
+        current_path, con = _connections.get(key, (None, None))
+        if current_path != path:
+            if build_database(key) is None:
+                return None
+            # A conexão da versão anterior não é fechada aqui: é liberada quando os cursores em uso terminarem
+            con = duckdb.connect(path, config=_config(read_only=True))
+            _connections[key] = (path, con)
+    # Cada consulta usa seu próprio cursor: a conexão não deve ser usada por várias threads ao mesmo tempo
+    return con.cursor()
+
+
+def filtered_counts(key, start_date, end_date, selections, columns=CATEGORY_COLUMNS):
+    """Contagens por dia e por coluna categórica aplicando os filtros, no mesmo formato de compute_counts.
+
+    `selections` mapeia o nome da coluna para os valores selecionados (vazio = sem filtro).
+    """
+    cursor = _connection(key)
+    if cursor is None:
+        return None
+    try:
+        available = {row[0] for row in cursor.execute(f"DESCRIBE {TABLE_NAME}").fetchall()}
+    except Exception:
+        cursor.close()
+        raise
+    columns = [c for c in columns if c in available]
+
+    date_column = _quote(DATE_COLUMN)
+    conditions = [f"{date_column} IS NOT NULL"]
+    params = []
+    if start_date and end_date:
+        conditions.append(f"{date_column} BETWEEN ? AND ?")
+        params += [pd.to_datetime(start_date).to_pydatetime(), pd.to_datetime(end_date).to_pydatetime()]
+    for column, selected in selections.items():
+        if selected:
+            conditions.append(f"CAST({_quote(column)} AS VARCHAR) IN ({', '.join('?' for _ in selected)})")
+            params += list(selected)
+
+    # Uma única varredura calcula todos os agrupamentos; GROUPING() identifica o agrupamento de cada linha
+    group_columns = [f"CAST({date_column} AS DATE)"] + [f"CAST({_quote(c)} AS VARCHAR)" for c in columns]
+    grouping_sets = ', '.join(f"({g})" for g in group_columns)
+    selects = ', '.join(f"{g} AS g{i}, GROUPING({g}) AS is_total{i}" for i, g in enumerate(group_columns))
+    sql = (
+        f"SELECT {selects}, COUNT(*) AS count FROM {TABLE_NAME} "
+        f"WHERE {' AND '.join(conditions)} GROUP BY GROUPING SETS ({grouping_sets})"
+    )
+    try:
+        result = cursor.execute(sql, params).df()
+    finally:
+        cursor.close()
+
+    days = result[result['is_total0'] == 0]
+    day_counts = pd.Series(days['count'].astype('int64').values, index=pd.Index([d.date() for d in pd.to_datetime(days['g0'])], name=DATE_COLUMN)).sort_index()
+    counts = {}
+    for i, column in enumerate(columns, start=1):
+        rows = result[(result[f'is_total{i}'] == 0) & result[f'g{i}'].notna()]
+        counts[column] = pd.Series(rows['count'].astype('int64').values, index=rows[f'g{i}'].astype(str).values, name='count')
+    return {'total': int(day_counts.sum()), 'days': day_counts, 'columns': counts}
+
+
+def summary_counts(key):
+    """Agregados do conjunto completo (ver get_summary) calculados no DuckDB, sem filtros."""
+    return filtered_counts(key, None, None, {}, SUMMARY_COLUMNS)
@@ -0,0 +1,140 @@
+# src/export.py
+"""Exportação em streaming das linhas que correspondem ao estado atual dos filtros.
+
+As linhas filtradas nunca são materializadas de uma vez: percorremos as posições
+selecionadas em blocos de EXPORT_CHUNK_ROWS linhas. O CSV é enviado bloco a bloco
+e o Parquet um row group por bloco, à medida que são gerados (o rodapé vai no fim).
+
+O XLSX é um zip que o openpyxl (modo write-only) só monta ao salvar: as linhas são
+gravadas num arquivo temporário em disco e o arquivo só começa a ser enviado depois
+de pronto. Para que o navegador e proxies não tratem a espera como conexão parada,
+os cabeçalhos da resposta são enviados antes desse trabalho; e, como o Excel não
+abre planilhas com mais de XLSX_MAX_ROWS linhas, exportações maiores são recusadas
+(use CSV ou Parquet).
+"""
+import io
+import os
+import tempfile
+
+import numpy as np
+from flask import Response
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+STREAM_BLOCK_SIZE = 64 * 1024
+
+DATE_FORMAT = '%d/%m/%Y' # Mesmo formato da planilha original, para que o arquivo possa ser reenviado
+XLSX_MAX_ROWS = 1048576 - 1 # Limite de linhas de uma planilha do Excel, menos o cabeçalho
+
+
+def _chunks(df, mask):
+    positions = np.flatnonzero(mask)
+    for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+        yield df.take(positions[start:start + EXPORT_CHUNK_ROWS])
+
+
+def _stream_file(tmp):
+    try:
+        tmp.seek(0)
+        while True:
+            block = tmp.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+    finally:
+        tmp.close() # O arquivo temporário é removido ao ser fechado
+
+
+def stream_csv(df, mask):
+    yield '\ufeff' # BOM para o Excel reconhecer o UTF-8 (acentos)
+    header = True
+    for chunk in _chunks(df, mask):
+        yield chunk.to_csv(index=False, header=header, date_format=DATE_FORMAT)
+        header = False
+    if header: # Nenhuma linha: envia apenas o cabeçalho
+        yield df.iloc[0:0].to_csv(index=False)
+
+
+class _DrainSink(io.RawIOBase):
+    """Destino de escrita cujo conteúdo é retirado (e enviado) a cada bloco gravado."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_xlsx(df, mask):
+    from openpyxl import Workbook
+
+    yield b'' # Envia os cabeçalhos antes de montar o arquivo
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("PAJs")
+    ws.append(list(df.columns))
+    for chunk in _chunks(df, mask):
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            ws.append(row)
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    yield from _stream_file(tmp)
+
+
+def stream_parquet(df, mask):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Colunas categóricas vão como valores simples: o Parquet monta o dicionário de cada row group
+    # só com os valores presentes nele, em vez de repetir todas as categorias do conjunto
+    schema = pa.Schema.from_pandas(df.iloc[0:0], preserve_index=False).remove_metadata()
+    schema = pa.schema([f.with_type(f.type.value_type) if pa.types.is_dictionary(f.type) else f for f in schema])
+    categorical = [c for c in df.columns if df[c].dtype.name == 'category']
+    sink = _DrainSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in _chunks(df, mask):
+            # Converte só as categorias usadas no bloco (memória proporcional ao bloco, não ao conjunto)
+            chunk = chunk.assign(**{c: chunk[c].cat.remove_unused_categories() for c in categorical})
+            table = pa.Table.from_pandas(chunk, preserve_index=False).replace_schema_metadata(None).cast(schema)
+            # Cada write_table fecha um row group, gravado por inteiro no destino
+            writer.write_table(table)
+            yield sink.drain()
+    yield sink.drain() # Rodapé com os metadados, gravado ao fechar
+
+
+# formato -> (gerador, mimetype, extensão)
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv; charset=utf-8', 'csv'),
+    'xlsx': (stream_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': (stream_parquet, 'application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def export_response(df, mask, fmt, filename="paj_filtrado"):
+    """Resposta Flask em streaming com as linhas de `df` selecionadas por `mask`."""
+    generator, mimetype, extension = EXPORT_FORMATS[fmt]
+    if fmt == 'xlsx' and np.count_nonzero(mask) > XLSX_MAX_ROWS:
+        return Response(
+            f"A planilha teria mais de {XLSX_MAX_ROWS} linhas (limite do Excel). Use CSV ou Parquet.",
+            status=413, mimetype='text/plain; charset=utf-8',
+        )
+    return Response(
+        generator(df, mask),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{extension}"'},
+    )
@@ -0,0 +1,210 @@
+# src/figures.py
+"""Construção enxuta das figuras do dashboard a partir das contagens (ver src/aggregates.py).
+
+Em vez de plotly.express (que monta um DataFrame por figura, resolve os argumentos
+e revalida tudo em update_traces/update_layout), os traces e layouts de cada gráfico
+(cores da DPU, títulos, eixos) são montados e validados com graph_objects uma única
+vez, na importação. A cada chamada só entram os arrays das contagens: os numéricos
+vão como typed arrays do Plotly.js (base64 dos bytes do array numpy, o mesmo formato
+que o plotly.py 6 gera), sem passar por listas Python. As figuras saem como dicts
+prontos para o Dash, serializados com o motor JSON do Plotly (orjson, se instalado).
+
+Cada gráfico de barras mostra no máximo BAR_LIMITS[coluna] categorias, escolhidas por
+seleção parcial (np.argpartition) em vez de ordenar todas as contagens; as demais são
+somadas numa barra "Outros". Clicar nela avança para as categorias seguintes (o
+deslocamento de cada gráfico fica no Store 'bar-offsets') e, a partir da segunda página,
+uma barra "Anteriores" no início volta uma página. Assim o tamanho da figura não
+depende do número de categorias.
+"""
+import base64
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# --- Cores DPU (extraídas anteriormente) ---
+DPU_COLORS = {
+    "primary_green": "#4d9529",
+    "primary_teal": "#00898f",
+    "dark_gray": "#373737",
+    "light_gray": "#f0f0f0", # Adicionando uma cor clara para fundos ou elementos secundários
+    "white": "#ffffff"
+}
+
+# Número máximo de barras (categorias) por gráfico; 0 mostra todas
+BAR_LIMITS = {
+    'Oficio': int(os.getenv("TOP_N_OFICIO", "20")),
+    'Tipo de Pretensão': int(os.getenv("TOP_N_PRETENSAO", "20")),
+    'Materia': int(os.getenv("TOP_N_MATERIA", "20")),
+    'Usuário': int(os.getenv("TOP_N_USUARIOS", "15")),
+}
+OTHERS_COLOR = DPU_COLORS["dark_gray"] # Barras que somam várias categorias ("Outros", "Anteriores")
+# Ação de cada barra, enviada em customdata[1] e lida no clique (ver update_bar_offsets em src/app.py)
+PAGE_PREVIOUS, CATEGORY, PAGE_NEXT = -1, 0, 1
+
+try:
+    import orjson # noqa: F401
+    pio.json.config.default_engine = 'orjson'
+except ImportError:
+    pass # Sem orjson o Plotly usa o encoder JSON padrão
+
+# Mesmo visual do template padrão do Plotly, mas apenas com os tipos de trace usados aqui:
+# o template completo traz padrões para todos os tipos e é enviado junto com cada figura
+_base_template = pio.templates['plotly']
+DPU_TEMPLATE = go.layout.Template(
+    layout=_base_template.layout,
+    data={'bar': _base_template.data.bar, 'scatter': _base_template.data.scatter},
+)
+
+
+def typed_array(values):
+    """Array numérico no formato typed array do Plotly.js: {'dtype', 'bdata'} (e 'shape' se 2D)."""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        values = values.astype('<i4') # O Plotly.js não tem inteiros de 64 bits
+    else:
+        values = values.astype('<f8')
+    spec = {'dtype': values.dtype.str[1:], 'bdata': base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii')}
+    if values.ndim > 1:
+        spec['shape'] = ', '.join(str(n) for n in values.shape)
+    return spec
+
+
+def _layout(title, x_title, y_title, tickangle=None):
+    layout = go.Layout(
+        template=DPU_TEMPLATE,
+        title={'text': title},
+        xaxis={'title': {'text': x_title}, 'tickangle': tickangle},
+        yaxis={'title': {'text': y_title}},
+        legend={'tracegroupgap': 0},
+        barmode='relative',
+        margin={'t': 60},
+    )
+    return layout.to_plotly_json()
+
+
+# Layouts pré-montados de cada gráfico
+TIME_SERIES_LAYOUT = _layout('Volume de PAJs por Data de Abertura', "Data de Abertura", "Número de PAJs")
+BAR_TITLES = {
+    'Oficio': 'Distribuição por Ofício',
+    'Tipo de Pretensão': 'Distribuição por Tipo de Pretensão',
+    'Materia': 'Distribuição por Matéria',
+    'Usuário': 'Distribuição por Usuário',
+}
+BAR_LAYOUTS = {
+    'Oficio': _layout(BAR_TITLES['Oficio'], "Ofício", "Quantidade"),
+    'Tipo de Pretensão': _layout(BAR_TITLES['Tipo de Pretensão'], "Tipo de Pretensão", "Quantidade", tickangle=-45),
+    'Materia': _layout(BAR_TITLES['Materia'], "Matéria", "Quantidade", tickangle=-45),
+    'Usuário': _layout(BAR_TITLES['Usuário'], "Usuário", "Quantidade", tickangle=-45),
+}
+BAR_COLORS = {
+    'Oficio': DPU_COLORS["primary_green"],
+    'Tipo de Pretensão': DPU_COLORS["primary_teal"],
+    'Materia': DPU_COLORS["primary_green"],
+    'Usuário': DPU_COLORS["primary_teal"],
+}
+
+# Traces pré-montados (sem os dados) de cada gráfico
+TIME_SERIES_TRACE = go.Scatter(
+    mode='lines',
+    line={'color': DPU_COLORS["primary_teal"], 'dash': 'solid'},
+    hovertemplate='Data de Abertura do PAJ=%{x}<br>count=%{y}<extra></extra>',
+    showlegend=False,
+).to_plotly_json()
+BAR_TRACES = {
+    column: go.Bar(
+        texttemplate='%{y} (%{customdata[0]:.1f}%)',
+        textposition='auto',
+        marker={'color': color},
+        hovertemplate=f'{column}=%{{x}}<br>Quantidade=%{{y}}<extra></extra>',
+        showlegend=False,
+    ).to_plotly_json()
+    for column, color in BAR_COLORS.items()
+}
+
+
+def empty_figures(title):
+    empty_fig = {'data': [], 'layout': {'title': title}}
+    return empty_fig, empty_fig, empty_fig, empty_fig, empty_fig
+
+
+def time_series_figure(day_counts):
+    """Série temporal a partir das contagens por dia (Series indexada por data)."""
+    days = np.asarray(day_counts.index, dtype='datetime64[D]')
+    trace = dict(TIME_SERIES_TRACE, x=np.datetime_as_string(days).tolist(), y=typed_array(day_counts.to_numpy()))
+    return {'data': [trace], 'layout': TIME_SERIES_LAYOUT}
+
+
+def top_positions(values, stop):
+    """Posições dos `stop` maiores valores, em ordem decrescente (empates na ordem original).
+
+    Só os `stop` selecionados por np.argpartition (O(n)) são ordenados. A chave combina
+    valor e posição para que o desempate não dependa do algoritmo de seleção.
+    """
+    n = len(values)
+    keys = values.astype('int64') * n + (n - 1 - np.arange(n))
+    if stop < n:
+        positions = np.argpartition(-keys, stop - 1)[:stop]
+    else:
+        positions = np.arange(n)
+    return positions[np.argsort(-keys[positions])]
+
+
+def bar_figure(column, counts, offset=0):
+    """Barras de uma coluna categórica com quantidade e percentual, a partir da posição `offset` do ranking."""
+    values = counts.to_numpy()
+    total = values.sum() # Percentuais sobre o total da coluna, inclusive as categorias fora do gráfico
+    limit = BAR_LIMITS.get(column) or max(len(values), 1)
+    # Deslocamento além do fim (ex.: os filtros reduziram as categorias): mostra a última página
+    offset = min(offset, max((len(values) - 1) // limit * limit, 0))
+    ranked = top_positions(values, min(offset + limit, len(values)))
+    shown = ranked[offset:]
+
+    labels = counts.index[shown].tolist()
+    y = values[shown]
+    actions = np.full(len(shown), CATEGORY)
+    previous = values[ranked[:offset]].sum()
+    remaining = total - previous - y.sum()
+    if offset:
+        labels.insert(0, f"« Anteriores ({offset} categorias)")
+        y = np.concatenate([[previous], y])
+        actions = np.concatenate([[PAGE_PREVIOUS], actions])
+    if remaining:
+        labels.append(f"Outros ({len(values) - offset - len(shown)} categorias)")
+        y = np.append(y, remaining)
+        actions = np.append(actions, PAGE_NEXT)
+
+    trace = dict(
+        BAR_TRACES[column],
+        x=labels,
+        y=typed_array(y),
+        # Lista simples, e não typed array: o dcc.Graph monta o clickData a partir de gd.data[...].customdata,
+        # que o Plotly.js não decodifica, e a ação da barra clicada se perderia (no máximo N + 2 linhas)
+        customdata=[[percentage, action] for percentage, action in zip((y / total * 100).tolist(), actions.tolist())],
+    )
+    if offset or remaining:
+        trace['marker'] = {'color': [OTHERS_COLOR if a else BAR_COLORS[column] for a in actions]}
+    layout = BAR_LAYOUTS[column]
+    if offset:
+        title = f"{BAR_TITLES[column]} (posições {offset + 1} a {offset + len(shown)})"
+        layout = dict(layout, title={'text': title})
+    return {'data': [trace], 'layout': layout}
+
+
+def figures_from_counts(counts, offsets=None):
+    """Monta as cinco figuras a partir das contagens por dia e por categoria.
+
+    `offsets` mapeia a coluna para o deslocamento da página exibida (ausente = primeira página).
+    """
+    if counts is None:
+        return empty_figures('Nenhum dado corresponde aos filtros selecionados')
+    columns = counts['columns']
+    offsets = offsets or {}
+    return (
+        time_series_figure(counts['days']),
+        bar_figure('Oficio', columns['Oficio'], offsets.get('Oficio', 0)),
+        bar_figure('Tipo de Pretensão', columns['Tipo de Pretensão'], offsets.get('Tipo de Pretensão', 0)),
+        bar_figure('Materia', columns['Materia'], offsets.get('Materia', 0)),
+        bar_figure('Usuário', columns['Usuário'], offsets.get('Usuário', 0)),
+    )
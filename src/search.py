@@ -0,0 +1,180 @@
+# src/search.py
+"""Busca textual por substring em Assistido e Pretensão, sem varrer o texto a cada consulta.
+
+Para cada conjunto de dados é montado uma única vez um índice invertido de trigramas
+sobre os valores distintos de cada coluna de texto (que já são categorias, ver
+compact_frame): trigrama -> códigos das categorias que o contêm. Uma consulta
+intersecta as listas dos trigramas de cada termo, confirma a substring apenas nas
+categorias candidatas e converte os códigos encontrados numa máscara de linhas.
+Maiúsculas/minúsculas e acentos são ignorados; cada termo da consulta precisa
+aparecer em Assistido ou em Pretensão.
+
+Numa mesclagem (upload em modo "acrescentar") o conjunto novo mantém as categorias
+do conjunto de origem com os mesmos códigos, então o índice é derivado do índice de
+origem indexando apenas as categorias novas (extend_index).
+
+Fontes com busca própria (a API, com índices GIN de trigramas no PostgreSQL) são
+registradas com register_search e retornam os números de PAJ encontrados.
+"""
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from src.datasets import KEY_COLUMN, DATASET_CACHE_SIZE, get_dataset, base_key_of, versioned_name
+
+SEARCH_COLUMNS = ['Assistido', 'Pretensão']
+
+# Índices por conjunto (nome versionado, ver versioned_name), LRU por processo
+_indexes = OrderedDict()
+_lock = threading.Lock()
+# Buscas remotas: chave do conjunto completo -> função(termos) que retorna os PAJs encontrados (ou None)
+_remote_searches = {}
+
+
+def normalize_text(text):
+    """Texto em minúsculas e sem acentos (mesma normalização usada na API)."""
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def search_terms(query):
+    return tuple(normalize_text(query).split()) if query else ()
+
+
+def register_search(key, search):
+    _remote_searches[key] = search
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _build_column_index(series):
+    if series.dtype.name != 'category':
+        series = series.astype('category')
+    texts = [normalize_text(c) for c in series.cat.categories]
+    postings = defaultdict(list)
+    for code, text in enumerate(texts):
+        for gram in _trigrams(text):
+            postings[gram].append(code)
+    return {
+        'codes': series.cat.codes.to_numpy(),
+        'texts': texts,
+        'postings': {gram: np.array(codes, dtype=np.int32) for gram, codes in postings.items()},
+    }
+
+
+def _extend_column_index(column_index, series):
+    # As primeiras categorias de `series` são as já indexadas em `column_index`, com os mesmos códigos
+    start = len(column_index['texts'])
+    texts = column_index['texts'] + [normalize_text(c) for c in series.cat.categories[start:]]
+    new_postings = defaultdict(list)
+    for code in range(start, len(texts)):
+        for gram in _trigrams(texts[code]):
+            new_postings[gram].append(code)
+    postings = dict(column_index['postings'])
+    for gram, codes in new_postings.items():
+        codes = np.array(codes, dtype=np.int32)
+        postings[gram] = np.concatenate([postings[gram], codes]) if gram in postings else codes
+    return {
+        'codes': series.cat.codes.to_numpy(),
+        'texts': texts,
+        'postings': postings,
+    }
+
+
+def build_index(df):
+    return {column: _build_column_index(df[column]) for column in SEARCH_COLUMNS if column in df.columns}
+
+
+def _remember(name, index):
+    with _lock:
+        _indexes[name] = index
+        _indexes.move_to_end(name)
+        while len(_indexes) > DATASET_CACHE_SIZE:
+            _indexes.popitem(last=False)
+
+
+def get_index(key, df=None):
+    """Índice de busca do conjunto `key` (montado no primeiro uso e mantido em cache)."""
+    name = versioned_name(key)
+    with _lock:
+        if name in _indexes:
+            _indexes.move_to_end(name)
+            return _indexes[name]
+    df = get_dataset(key) if df is None else df
+    if df is None:
+        return None
+    index = build_index(df)
+    _remember(name, index)
+    return index
+
+
+def extend_index(base_key, key):
+    """Índice de `key`, mesclagem sobre `base_key` (ver append_dataset), derivado do índice de `base_key`.
+
+    Colunas cujas categorias não começam pelas do conjunto de origem são indexadas do zero.
+    """
+    if key == base_key:
+        return get_index(key)
+    base, df = get_dataset(base_key), get_dataset(key)
+    base_index = get_index(base_key, base) if base is not None else None
+    if base_index is None or df is None:
+        return get_index(key, df)
+    index = {}
+    for column in SEARCH_COLUMNS:
+        if column not in df.columns:
+            continue
+        series, old = df[column], base[column] if column in base.columns else None
+        if (column in base_index and old is not None and old.dtype.name == 'category' and series.dtype.name == 'category'
+                and series.cat.categories[:len(old.cat.categories)].equals(old.cat.categories)):
+            index[column] = _extend_column_index(base_index[column], series)
+        else:
+            index[column] = _build_column_index(series)
+    _remember(versioned_name(key), index)
+    return index
+
+
+def _matching_codes(column_index, term):
+    texts = column_index['texts']
+    grams = _trigrams(term)
+    if grams:
+        candidates = None
+        # Começa pelas listas mais curtas para a interseção encolher o quanto antes
+        for gram in sorted(grams, key=lambda g: len(column_index['postings'].get(g, ()))):
+            posting = column_index['postings'].get(gram)
+            if posting is None:
+                return np.empty(0, dtype=np.int32)
+            candidates = posting if candidates is None else np.intersect1d(candidates, posting, assume_unique=True)
+            if not len(candidates):
+                return candidates
+    else:
+        candidates = range(len(texts)) # Termo com menos de 3 caracteres: confere todas as categorias
+    return np.array([code for code in candidates if term in texts[code]], dtype=np.int32)
+
+
+def search_mask(key, query, df=None):
+    """Máscara booleana (numpy) das linhas de `key` que correspondem à busca."""
+    df = get_dataset(key) if df is None else df
+    terms = search_terms(query)
+    if not terms:
+        return np.ones(len(df), dtype=bool)
+
+    remote = _remote_searches.get(base_key_of(key))
+    if remote is not None and KEY_COLUMN in df.columns:
+        found = remote(terms)
+        if found is not None:
+            return df[KEY_COLUMN].isin(found).to_numpy()
+
+    index = get_index(key, df)
+    mask = np.ones(len(df), dtype=bool)
+    for term in terms:
+        term_mask = np.zeros(len(df), dtype=bool)
+        for column_index in index.values():
+            codes = _matching_codes(column_index, term)
+            if len(codes):
+                term_mask |= np.isin(column_index['codes'], codes)
+        mask &= term_mask
+    return mask